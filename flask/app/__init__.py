@@ -1,18 +1,121 @@
+import os
 from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_restful import Api
-from .upload import upload_bp
 
+# Created before the blueprints are imported, their modules use the models
 db = SQLAlchemy()
 
+from .upload import upload_bp, base_dir, UploadRequest
+from .score import score_bp
+from .bulk_import import bulk_bp, new_parser_pool
+from .history import history_bp
+from .jobs import JobQueue
+from .result_cache import ResultCache
+from .storage import GroupCommitter, configure_sqlite, engine_options
+from .monitoring import monitoring_bp
+from .profiling import init_request_profiling
+from predictor.scripts.model_registry import ModelRegistry, WORKOUT_TYPES
+from predictor.scripts.inference_pool import InferencePool
+from predictor.scripts.telemetry import configure_logging
 
-def create_app():
+
+def create_app(config=None):
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_POOL_SIZE'] = 10
+    app.config['DB_MAX_OVERFLOW'] = 10
+    app.config['DB_POOL_TIMEOUT'] = 30
+    app.config['SQLITE_JOURNAL_MODE'] = 'WAL'
+    app.config['SQLITE_SYNCHRONOUS'] = 'NORMAL'
+    app.config['SQLITE_BUSY_TIMEOUT'] = 5000
+    # Coalesce the writes of concurrent requests into one transaction per GROUP_COMMIT_WINDOW seconds
+    app.config['GROUP_COMMIT'] = False
+    app.config['GROUP_COMMIT_WINDOW'] = 0.005
+    app.config['GROUP_COMMIT_MAX_BATCH'] = 256
+    app.config['MODEL_DIR'] = os.path.join(base_dir, 'models')
+    app.config['MODEL_CACHE_SIZE'] = None
+    app.config['MODEL_ENGINE'] = 'auto'
+    app.config['MAX_SCORE_BATCH_SIZE'] = 10000
+    app.config['UPLOAD_SPOOL_THRESHOLD'] = 16 * 1024 * 1024
+    app.config['CLASSIFICATION_WORKERS'] = 2
+    app.config['CLASSIFICATION_QUEUE_SIZE'] = 32
+    app.config['JOB_RESULT_TTL'] = 600
+    # 0 runs inference in the web process, N > 0 serves it from N worker processes
+    app.config['INFERENCE_PROCESSES'] = 0
+    app.config['INFERENCE_START_METHOD'] = 'spawn'
+    app.config['INFERENCE_TIMEOUT'] = 30
+    # Results of repeat uploads; 0 entries disables the cache, a directory adds a disk tier
+    app.config['RESULT_CACHE_SIZE'] = 1024
+    app.config['RESULT_CACHE_TTL'] = 24 * 3600
+    app.config['RESULT_CACHE_DIR'] = None
+    app.config['RESULT_CACHE_DISK_MAX_ENTRIES'] = 100000
+    app.config['RESULT_CACHE_DISK_MAX_BYTES'] = 256 * 1024 * 1024
+    # Bulk imports parse FIT files in this many processes (0 parses them in the request thread)
+    app.config['BULK_PARSE_PROCESSES'] = os.cpu_count() or 1
+    app.config['BULK_MAX_FILES'] = 1000
+    app.config['BULK_MAX_FILE_SIZE'] = 64 * 1024 * 1024
+    # Parsed files of one workout type scored (and streamed back) together
+    app.config['BULK_SCORE_BATCH_SIZE'] = 32
+    # Uncompressed size of all files of one import, and the largest request body read at all
+    app.config['BULK_MAX_TOTAL_SIZE'] = 256 * 1024 * 1024
+    app.config['MAX_CONTENT_LENGTH'] = 256 * 1024 * 1024
+    app.config['HISTORY_PAGE_SIZE'] = 50
+    app.config['HISTORY_MAX_PAGE_SIZE'] = 500
+    app.config['ITEMS_PAGE_SIZE'] = 100
+    app.config['ITEMS_MAX_PAGE_SIZE'] = 1000
+    app.config['ITEMS_MAX_BULK_SIZE'] = 10000
+    # Logs of the app and predictor packages; records below LOG_LEVEL are dropped before formatting
+    app.config['LOG_LEVEL'] = 'WARNING'
+    app.config['LOG_JSON'] = True
+    # Per-request cProfile captures, see profiling.init_request_profiling
+    app.config['PROFILE_DIR'] = os.path.join(app.instance_path, 'profiles')
+    # Streamed responses (bulk imports) finish after the request hooks, so they are not listed
+    app.config['PROFILE_ENDPOINTS'] = ('upload.upload_file', 'score.score_batch')
+    app.config['PROFILE_SAMPLE_RATE'] = 0.0
+    app.config['PROFILE_HEADER'] = 'X-Profile'
+    app.config['PROFILE_TOKEN'] = None
+    if config:
+        app.config.update(config)
+
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_JSON'])
 
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     db.init_app(app)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            configure_sqlite(db.engine, app.config['SQLITE_JOURNAL_MODE'], app.config['SQLITE_SYNCHRONOUS'],
+                             app.config['SQLITE_BUSY_TIMEOUT'])
+    if app.config['GROUP_COMMIT']:
+        app.extensions['group_commit'] = GroupCommitter(app, db, app.config['GROUP_COMMIT_WINDOW'],
+                                                        app.config['GROUP_COMMIT_MAX_BATCH'])
+
+    registry = ModelRegistry(app.config['MODEL_DIR'], max_size=app.config['MODEL_CACHE_SIZE'],
+                             engine=app.config['MODEL_ENGINE'])
+    if app.config['INFERENCE_PROCESSES'] > 0:
+        # Every worker holds its own warm models, so the web process does not preload them
+        app.extensions['inference_pool'] = InferencePool(app.config['INFERENCE_PROCESSES'],
+                                                         app.config['MODEL_DIR'],
+                                                         engine=app.config['MODEL_ENGINE'],
+                                                         start_method=app.config['INFERENCE_START_METHOD'],
+                                                         timeout=app.config['INFERENCE_TIMEOUT'])
+    else:
+        registry.preload(WORKOUT_TYPES)
+    app.extensions['model_registry'] = registry
+    if app.config['RESULT_CACHE_SIZE'] > 0:
+        app.extensions['result_cache'] = ResultCache(app.config['RESULT_CACHE_SIZE'],
+                                                     app.config['RESULT_CACHE_TTL'],
+                                                     app.config['RESULT_CACHE_DIR'],
+                                                     app.config['RESULT_CACHE_DISK_MAX_ENTRIES'],
+                                                     app.config['RESULT_CACHE_DISK_MAX_BYTES'])
+    if app.config['BULK_PARSE_PROCESSES'] > 0:
+        app.extensions['fit_parser_pool'] = new_parser_pool(app)
+    app.extensions['classification_jobs'] = JobQueue(app.config['CLASSIFICATION_WORKERS'],
+                                                     app.config['CLASSIFICATION_QUEUE_SIZE'],
+                                                     app.config['JOB_RESULT_TTL'])
 
     from .resources import ItemResource, ItemListResource
     api = Api(app)
@@ -23,4 +126,9 @@ def create_app():
     CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
 
     app.register_blueprint(upload_bp)
+    app.register_blueprint(score_bp)
+    app.register_blueprint(bulk_bp)
+    app.register_blueprint(history_bp)
+    app.register_blueprint(monitoring_bp)
+    init_request_profiling(app)
     return app
@@ -0,0 +1,264 @@
+import io
+import json
+import hashlib
+import zipfile
+import multiprocessing
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from predictor.scripts.classify_user import extract_workout_features
+from predictor.scripts.inference_pool import exit_with_parent
+from . import db
+from .models import Workout
+from .storage import run_write
+
+bulk_bp = Blueprint('bulk_import', __name__)
+
+
+def new_parser_pool(app):
+    """Process pool bulk imports parse FIT files in; processes start with the first import"""
+    return ProcessPoolExecutor(app.config['BULK_PARSE_PROCESSES'],
+                               mp_context=multiprocessing.get_context(app.config['INFERENCE_START_METHOD']),
+                               initializer=exit_with_parent)
+
+
+class BulkImportError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _Collected(list):
+    """(file name, bytes) pairs of a bulk import and their total size"""
+    size = 0
+
+
+def _check_size(files, name, size):
+    max_size, max_total = current_app.config['BULK_MAX_FILE_SIZE'], current_app.config['BULK_MAX_TOTAL_SIZE']
+    if size > max_size:
+        raise BulkImportError(f"{name} is larger than {max_size} bytes", 413)
+    if files.size + size > max_total:
+        raise BulkImportError(f"The files of an import may add up to at most {max_total} bytes", 413)
+
+
+def _add_file(files, name, data):
+    if len(files) >= current_app.config['BULK_MAX_FILES']:
+        raise BulkImportError(f"At most {current_app.config['BULK_MAX_FILES']} files can be imported at once", 413)
+    _check_size(files, name, len(data))
+    files.append((name, data))
+    files.size += len(data)
+
+
+def _add_zip(files, archive):
+    try:
+        with zipfile.ZipFile(archive) as bundle:
+            for entry in bundle.infolist():
+                if entry.is_dir() or not entry.filename.lower().endswith('.fit'):
+                    continue
+                # Checked before decompressing, so an archive cannot expand without bound
+                _check_size(files, entry.filename, entry.file_size)
+                _add_file(files, entry.filename, bundle.read(entry))
+    except zipfile.BadZipFile as e:
+        raise BulkImportError(f"Invalid zip archive: {e}")
+
+
+def collect_fit_files():
+    """
+    Read the FIT files of a bulk import request.
+
+    Accepts multipart 'files' (or 'file') parts, each a .fit file or a .zip of them,
+    or a zip archive as the request body. Bodies above MAX_CONTENT_LENGTH are refused
+    before they are read, and the files may add up to BULK_MAX_TOTAL_SIZE.
+
+    Returns:
+        list: (file name, bytes) pairs
+    """
+    files = _Collected()
+    try:
+        if request.mimetype in ('application/zip', 'application/x-zip-compressed'):
+            _add_zip(files, io.BytesIO(request.get_data()))
+            return files
+
+        max_size = current_app.config['BULK_MAX_FILE_SIZE']
+        for upload in request.files.getlist('files') + request.files.getlist('file'):
+            if upload.filename.lower().endswith('.zip'):
+                _add_zip(files, upload.stream)
+                continue
+            _add_file(files, upload.filename, upload.stream.read(max_size + 1))
+    except RequestEntityTooLarge:
+        raise BulkImportError(f"The request is larger than {current_app.config['MAX_CONTENT_LENGTH']} bytes", 413)
+    return files
+
+
+def _parsed(executor, jobs, window=8):
+    """
+    Yield (job, (features, start time) or exception) as each FIT file finishes parsing.
+
+    At most `window` files are handed to the executor at a time, so its queue never holds
+    copies of the whole import.
+    """
+    if executor is not None:
+        waiting = deque(jobs)
+        futures, unparsed = {}, []
+        while waiting or futures:
+            try:
+                while waiting and len(futures) < window:
+                    job = waiting[0]
+                    futures[executor.submit(extract_workout_features, job['data'], job['workout_type'],
+                                            job['age'], with_start_time=True)] = job
+                    waiting.popleft()
+            except BrokenProcessPool:
+                unparsed.extend(waiting)
+                waiting.clear()
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = futures.pop(future)
+                try:
+                    yield job, future.result()
+                except BrokenProcessPool:
+                    unparsed.append(job)
+                except Exception as e:
+                    yield job, e
+
+        if unparsed:
+            # A worker died (e.g. killed while parsing); replace the pool and parse the rest here
+            current_app.extensions['fit_parser_pool'] = new_parser_pool(current_app)
+            executor.shutdown(wait=False)
+        jobs = unparsed
+
+    for job in jobs:
+        try:
+            yield job, extract_workout_features(job['data'], job['workout_type'], job['age'], with_start_time=True)
+        except Exception as e:
+            yield job, e
+
+
+def _line(job, **fields):
+    return json.dumps({'file': job['name'], 'workout_type': job['workout_type'], **fields}) + '\n'
+
+
+def _score(scorer, workout_type, batch, cache, user_id=None):
+    """Score a batch of parsed files of one workout type with a single evaluate call"""
+    features = np.array([row for _, row in batch], dtype=np.float64)
+    try:
+        percentiles, recommendations = scorer.evaluate(workout_type, features)
+    except FileNotFoundError:
+        for job, _ in batch:
+            yield _line(job, error=f'No model for workout type {workout_type}')
+        return
+    except Exception as e:
+        for job, _ in batch:
+            yield _line(job, error='An error occurred while scoring the file', details=str(e))
+        return
+
+    if user_id is not None:
+        # Stamped with when the activity took place rather than when it was imported
+        rows = [Workout.row(user_id, workout_type, features, float(percentile), job['model_version'],
+                            job['start_time'])
+                for (job, features), percentile in zip(batch, percentiles)]
+        run_write(db, lambda: Workout.bulk_insert(rows, commit=False))
+
+    for (job, _), percentile, recommendation in zip(batch, percentiles, recommendations):
+        if cache is not None and job['cache_key'] is not None:
+            cache.put(job['cache_key'], {'percentile': float(percentile), 'rec': recommendation})
+        yield _line(job, percentile=float(percentile), rec=recommendation)
+
+
+def import_results(jobs, scorer, executor=None, cache=None, user_id=None, window=8, score_batch=32):
+    """
+    Parse FIT files in parallel and yield one NDJSON line per file.
+
+    Cached files are answered first. Parsed files are scored with one batched model call
+    per workout type as soon as `score_batch` of them are waiting or the last file of
+    their type is parsed, so results stream out while the other files are still parsed.
+
+    Args:
+        jobs (list): Dicts with name, data, workout_type, age, cache_key and model_version
+        scorer: ModelRegistry or InferencePool with evaluate(workout_type, workouts)
+        executor: Executor to parse in, or None to parse in this thread
+        cache (ResultCache): Cache to answer repeat files from and to store new results in
+        user_id (str): Record the newly scored workouts in this user's history (one bulk
+            insert per scored batch)
+        window (int): Files handed to the executor at a time
+        score_batch (int): Parsed files of a workout type scored (and flushed) together
+    """
+    to_parse = []
+    for job in jobs:
+        cached = cache.get(job['cache_key']) if cache is not None and job['cache_key'] is not None else None
+        if cached is not None:
+            yield _line(job, percentile=cached['percentile'], rec=cached['rec'], cached=True)
+        else:
+            to_parse.append(job)
+
+    remaining = Counter(job['workout_type'] for job in to_parse)
+    batches = defaultdict(list)
+    for job, result in _parsed(executor, to_parse, window):
+        # The features are all that is left to do with the file
+        job['data'] = None
+        workout_type = job['workout_type']
+        remaining[workout_type] -= 1
+        if isinstance(result, Exception):
+            yield _line(job, error='An error occurred while parsing the file', details=str(result))
+        else:
+            features, job['start_time'] = result
+            if not np.isfinite(features).all():
+                yield _line(job, error='The file does not contain the heart rate data needed for scoring')
+            else:
+                batches[workout_type].append((job, features))
+
+        if batches[workout_type] and (remaining[workout_type] == 0
+                                      or len(batches[workout_type]) >= score_batch):
+            yield from _score(scorer, workout_type, batches.pop(workout_type), cache, user_id)
+
+
+@bulk_bp.route('/upload/bulk', methods=['POST'])
+def bulk_upload():
+    try:
+        files = collect_fit_files()
+    except BulkImportError as e:
+        return jsonify({'error': str(e)}), e.status
+    if not files:
+        return jsonify({'error': 'No FIT files in the request'}), 400
+
+    workout_type = request.form.get('workout_type', request.form.get('workoutType', 'Strength'))
+    age = request.form.get('age', 25)
+    try:
+        # Optional {"file name": "workout type"} overrides for mixed batches
+        workout_types = json.loads(request.form.get('workout_types', '{}'))
+    except ValueError:
+        workout_types = None
+    if not isinstance(workout_types, dict) or not all(isinstance(value, str) for value in workout_types.values()):
+        return jsonify({'error': "'workout_types' must be a JSON object of file names to workout types"}), 400
+
+    user_id = request.form.get('user_id')
+    registry = current_app.extensions['model_registry']
+    cache = current_app.extensions.get('result_cache')
+    model_versions = {}
+    jobs = []
+    for name, data in files:
+        job_type = workout_types.get(name, workout_type)
+        if job_type not in model_versions:
+            try:
+                model_versions[job_type] = registry.model_version(job_type)
+            except FileNotFoundError:
+                model_versions[job_type] = None
+        cache_key = None
+        if cache is not None and model_versions[job_type] is not None:
+            cache_key = cache.key(hashlib.sha256(data).hexdigest(), job_type, age, model_versions[job_type])
+        jobs.append({'name': name, 'data': data, 'workout_type': job_type, 'age': age, 'cache_key': cache_key,
+                     'model_version': model_versions[job_type]})
+
+    scorer = current_app.extensions.get('inference_pool') or registry
+    executor = current_app.extensions.get('fit_parser_pool')
+    # Two files per parser process keep every process busy
+    window = 2 * max(current_app.config['BULK_PARSE_PROCESSES'], 1)
+    return Response(stream_with_context(import_results(jobs, scorer, executor, cache, user_id, window,
+                                                       current_app.config['BULK_SCORE_BATCH_SIZE'])),
+                    mimetype='application/x-ndjson')
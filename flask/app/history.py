@@ -0,0 +1,74 @@
+import base64
+from datetime import datetime, timezone
+from flask import Blueprint, request, jsonify, current_app
+from .models import Workout
+from .storage import run_write
+from . import db
+
+history_bp = Blueprint('history', __name__)
+
+
+def encode_cursor(cursor):
+    timestamp, workout_id = cursor
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{workout_id}".encode()).decode()
+
+
+def decode_cursor(token):
+    """(timestamp, id) from an encode_cursor token; raises ValueError if it is malformed"""
+    try:
+        timestamp, workout_id = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(workout_id)
+    except (TypeError, UnicodeError, base64.binascii.Error) as e:
+        raise ValueError(str(e))
+
+
+def _parse_timestamp(value):
+    """Naive UTC datetime from an ISO 8601 string (None stays None)"""
+    if value is None:
+        return None
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+@history_bp.route('/users/<user_id>/workouts', methods=['GET'])
+def workout_history(user_id):
+    try:
+        limit = min(int(request.args.get('limit', current_app.config['HISTORY_PAGE_SIZE'])),
+                    current_app.config['HISTORY_MAX_PAGE_SIZE'])
+        before = decode_cursor(request.args['cursor']) if 'cursor' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': 'Invalid limit or cursor', 'details': str(e)}), 400
+    if limit < 1:
+        return jsonify({'error': "'limit' must be positive"}), 400
+
+    workouts, next_cursor = Workout.history(user_id, request.args.get('workout_type'), before, limit)
+    return jsonify({
+        'user_id': user_id,
+        'workouts': [workout.to_dict() for workout in workouts],
+        'next_cursor': encode_cursor(next_cursor) if next_cursor is not None else None
+    }), 200
+
+
+@history_bp.route('/users/<user_id>/workouts', methods=['POST'])
+def add_workouts(user_id):
+    data = request.get_json(silent=True)
+    workouts = data.get('workouts') if isinstance(data, dict) else data
+    if not isinstance(workouts, list):
+        return jsonify({'error': "Expected a list of workouts or an object with a 'workouts' list"}), 400
+
+    max_batch_size = current_app.config['MAX_SCORE_BATCH_SIZE']
+    if len(workouts) > max_batch_size:
+        return jsonify({'error': f'At most {max_batch_size} workouts can be added per request'}), 413
+
+    try:
+        rows = [Workout.row(user_id, workout['workout_type'], workout['features'],
+                            workout.get('percentile'), workout.get('model_version'),
+                            _parse_timestamp(workout.get('timestamp')))
+                for workout in workouts]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': 'Invalid workouts', 'details': str(e)}), 400
+
+    added = run_write(db, lambda: Workout.bulk_insert(rows, commit=False))
+    return jsonify({'user_id': user_id, 'added': added}), 201
@@ -0,0 +1,75 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class JobQueue:
+    def __init__(self, workers=2, max_pending=32, result_ttl=600):
+        """
+        Bounded pool of worker threads consuming a local job queue.
+
+        Args:
+            workers (int): Number of worker threads
+            max_pending (int): Maximum number of queued jobs; submit() raises queue.Full beyond it
+            result_ttl (int): Seconds a finished job's result is kept for polling
+        """
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f"classification-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) and return its job id.
+
+        Raises:
+            queue.Full: If max_pending jobs are already waiting
+        """
+        self._evict_expired()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {'status': 'queued', 'submitted_at': time.time()}
+        try:
+            self._queue.put_nowait((job_id, func, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            raise
+        return job_id
+
+    def get(self, job_id):
+        """Return a copy of the job's state, or None if it is unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job_id, func, args, kwargs = self._queue.get()
+            with self._lock:
+                self._jobs[job_id]['status'] = 'running'
+            try:
+                result = func(*args, **kwargs)
+                update = {'status': 'done', 'result': result}
+            except Exception as e:
+                update = {'status': 'failed', 'error': str(e)}
+            update['finished_at'] = time.time()
+            with self._lock:
+                self._jobs[job_id].update(update)
+            self._queue.task_done()
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.get('finished_at', cutoff + 1) < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
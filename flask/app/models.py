@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+from sqlalchemy import insert, or_, and_
 from . import db
 
 class Item(db.Model):
@@ -7,3 +9,116 @@ class Item(db.Model):
 
     def to_dict(self):
         return {'id': self.id, 'name': self.name, 'description': self.description}
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Workout(db.Model):
+    """A scored workout of one user; timestamps are naive UTC"""
+    # Feature name -> column, in FEATURES order
+    FEATURE_COLUMNS = {'HRmax': 'hr_max', 'HR%': 'hr_percent', 'TLI': 'tli', 'MET': 'met', 'WEI': 'wei'}
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(64), nullable=False)
+    workout_type = db.Column(db.String(50), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=_utcnow)
+    hr_max = db.Column(db.Float)
+    hr_percent = db.Column(db.Float)
+    tli = db.Column(db.Float)
+    met = db.Column(db.Float)
+    wei = db.Column(db.Float)
+    percentile = db.Column(db.Float)
+    model_version = db.Column(db.String(64))
+
+    # History pages are index range scans: newest first, optionally for one workout type,
+    # with id as the tie breaker of the keyset cursor
+    __table_args__ = (
+        db.Index('ix_workout_user_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_workout_user_type_timestamp', 'user_id', 'workout_type', 'timestamp', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'workout_type': self.workout_type,
+            'timestamp': self.timestamp.isoformat(),
+            'features': {feat: getattr(self, column) for feat, column in self.FEATURE_COLUMNS.items()},
+            'percentile': self.percentile,
+            'model_version': self.model_version
+        }
+
+    @classmethod
+    def row(cls, user_id, workout_type, features, percentile=None, model_version=None, timestamp=None):
+        """
+        Column values of one workout for bulk_insert.
+
+        Args:
+            user_id (str): Owner of the workout
+            workout_type (str): Workout type
+            features: HRmax, HR%, TLI, MET and WEI, as a sequence in that order or a dict
+            percentile (float): Percentile the workout was scored at
+            model_version (str): Version of the model that scored it
+            timestamp (datetime): When the workout took place (now if None)
+
+        Returns:
+            dict: Column name -> value
+        """
+        if isinstance(features, dict):
+            features = [features.get(feat) for feat in cls.FEATURE_COLUMNS]
+        row = {'user_id': str(user_id), 'workout_type': workout_type, 'percentile': percentile,
+               'model_version': model_version, 'timestamp': timestamp or _utcnow()}
+        for column, value in zip(cls.FEATURE_COLUMNS.values(), features):
+            row[column] = None if value is None or value != value else float(value)
+        return row
+
+    @classmethod
+    def bulk_insert(cls, rows, commit=True):
+        """
+        Insert many workouts with one executemany statement, without building ORM objects.
+
+        Args:
+            rows (list): Dicts from Workout.row
+            commit (bool): Commit the session afterwards
+
+        Returns:
+            int: Number of inserted workouts
+        """
+        if rows:
+            db.session.execute(insert(cls), rows)
+            if commit:
+                db.session.commit()
+        return len(rows)
+
+    @classmethod
+    def history(cls, user_id, workout_type=None, before=None, limit=50):
+        """
+        One page of a user's workouts, newest first.
+
+        Pages are addressed by a keyset cursor instead of an offset, so every page is a
+        range scan of the (user_id, [workout_type,] timestamp, id) index however deep it is.
+
+        Args:
+            user_id (str): Owner of the workouts
+            workout_type (str): Only workouts of this type (all types if None)
+            before (tuple): (timestamp, id) of the last workout of the previous page
+            limit (int): Page size
+
+        Returns:
+            tuple: (list of Workout, cursor of the next page or None on the last page)
+        """
+        query = cls.query.filter(cls.user_id == str(user_id))
+        if workout_type is not None:
+            query = query.filter(cls.workout_type == workout_type)
+        if before is not None:
+            timestamp, last_id = before
+            query = query.filter(or_(cls.timestamp < timestamp,
+                                     and_(cls.timestamp == timestamp, cls.id < last_id)))
+        workouts = query.order_by(cls.timestamp.desc(), cls.id.desc()).limit(limit + 1).all()
+
+        if len(workouts) <= limit:
+            return workouts, None
+        workouts = workouts[:limit]
+        return workouts, (workouts[-1].timestamp, workouts[-1].id)
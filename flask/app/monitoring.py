@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from predictor.scripts.telemetry import REGISTRY
+
+monitoring_bp = Blueprint('monitoring', __name__)
+
+
+@monitoring_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage timings and error counts of this process in the Prometheus text format"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
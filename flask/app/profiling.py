@@ -0,0 +1,60 @@
+import os
+import random
+import logging
+from flask import request, current_app, g
+from predictor.scripts.profiling import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+
+def _wants_profile():
+    config = current_app.config
+    if request.endpoint not in config['PROFILE_ENDPOINTS']:
+        return False
+    # The header only works with the configured token, so clients cannot make the server profile
+    token = config['PROFILE_TOKEN']
+    if token and request.headers.get(config['PROFILE_HEADER']) == token:
+        return True
+    return config['PROFILE_SAMPLE_RATE'] > 0 and random.random() < config['PROFILE_SAMPLE_RATE']
+
+
+def start_request_profile():
+    if _wants_profile():
+        # Started before the body is parsed, so receiving the upload is part of the profile
+        g.request_profile = RequestProfile(current_app.config['PROFILE_DIR'], request.endpoint).start()
+
+
+def stop_request_profile(response):
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return response
+
+    label = request.endpoint.rsplit('.', 1)[-1]
+    workout_type = request.form.get('workout_type', request.form.get('workoutType'))
+    profile.label = f"{label}-{workout_type}" if workout_type else label
+    path = profile.stop()
+    if path is not None:
+        response.headers['X-Profile-Id'] = os.path.basename(path)
+        logger.info("Request profile written", extra={'endpoint': request.endpoint, 'path': path})
+    return response
+
+
+def discard_request_profile(exc):
+    # after_request is skipped when the view raises; never leave the profiler running
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        profile.stop()
+
+
+def init_request_profiling(app):
+    """
+    Profile single requests of PROFILE_ENDPOINTS with cProfile into PROFILE_DIR.
+
+    A request is profiled when it carries PROFILE_HEADER set to PROFILE_TOKEN, or at
+    random with probability PROFILE_SAMPLE_RATE. The profile file name is returned in the
+    X-Profile-Id response header; aggregate profiles with
+    python -m predictor.scripts.profiling <PROFILE_DIR>.
+    """
+    app.before_request(start_request_profile)
+    app.after_request(stop_request_profile)
+    app.teardown_request(discard_request_profile)
@@ -1,19 +1,94 @@
-from flask import request
+import hashlib
+from flask import request, current_app, Response
 from flask_restful import Resource
+from sqlalchemy import insert
 from .models import Item
+from .storage import run_write
 from . import db
 
+ITEM_FIELDS = ('id', 'name', 'description')
+
+
+def _requested_fields():
+    """Columns named by ?fields=a,b (all by default); raises ValueError for unknown ones"""
+    if 'fields' not in request.args:
+        return ITEM_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in request.args['fields'].split(',') if field.strip()))
+    unknown = [field for field in fields if field not in ITEM_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields {unknown}, choose from {list(ITEM_FIELDS)}")
+    return fields
+
+
 class ItemListResource(Resource):
     def get(self):
-        items = Item.query.all()
-        return [item.to_dict() for item in items], 200
+        """
+        Items in id order: all of them as a JSON list, or one page of them with ?limit= and
+        ?after=<next_cursor of the previous page> as {'items': [...], 'next_cursor': ...}.
+        ?fields= picks the columns in both shapes.
+
+        Only the requested columns (and id, the cursor) are loaded. The ETag is computed
+        from the loaded rows, so a matching If-None-Match is answered with 304 before
+        anything is serialised.
+        """
+        # Clients of the unpaginated endpoint keep getting a bare list
+        paginated = 'limit' in request.args or 'after' in request.args
+        try:
+            fields = _requested_fields()
+            limit = min(int(request.args.get('limit', current_app.config['ITEMS_PAGE_SIZE'])),
+                        current_app.config['ITEMS_MAX_PAGE_SIZE'])
+            after = int(request.args.get('after', 0))
+        except ValueError as e:
+            return {'error': 'Invalid query parameters', 'details': str(e)}, 400
+        if limit < 1:
+            return {'error': "'limit' must be positive"}, 400
+
+        columns = [getattr(Item, field) for field in dict.fromkeys(('id',) + fields)]
+        query = db.session.query(*columns).filter(Item.id > after).order_by(Item.id)
+        next_cursor = None
+        if paginated:
+            rows = query.limit(limit + 1).all()
+            next_cursor = rows[limit - 1].id if len(rows) > limit else None
+            rows = rows[:limit]
+        else:
+            rows = query.all()
+
+        etag = hashlib.sha1(repr((paginated, fields, next_cursor, [tuple(row) for row in rows]))
+                            .encode('utf-8')).hexdigest()
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+        items = [{field: getattr(row, field) for field in fields} for row in rows]
+        if not paginated:
+            return items, 200, {'ETag': f'"{etag}"'}
+        return {'items': items, 'next_cursor': next_cursor}, 200, {'ETag': f'"{etag}"'}
 
     def post(self):
+        """Create one item, or all items of a JSON list in a single transaction"""
         data = request.json
-        item = Item(name=data['name'], description=data.get('description', ''))
-        db.session.add(item)
-        db.session.commit()
-        return item.to_dict(), 201
+        if not isinstance(data, list):
+            name, description = data['name'], data.get('description', '')
+
+            def create():
+                item = Item(name=name, description=description)
+                db.session.add(item)
+                db.session.flush()
+                return item.to_dict()
+            return run_write(db, create), 201
+
+        max_bulk_size = current_app.config['ITEMS_MAX_BULK_SIZE']
+        if len(data) > max_bulk_size:
+            return {'error': f'At most {max_bulk_size} items can be created per request'}, 413
+        if not all(isinstance(entry, dict) and isinstance(entry.get('name'), str) for entry in data):
+            return {'error': "Every item needs a 'name'"}, 400
+        if not data:
+            return [], 201
+
+        rows = [{'name': entry['name'], 'description': entry.get('description', '')} for entry in data]
+        # Ids come back through RETURNING, so committed rows are not reloaded one by one
+        ids = run_write(db, lambda: db.session.scalars(
+            insert(Item).returning(Item.id, sort_by_parameter_order=True), rows).all())
+        return [{'id': item_id, **row} for item_id, row in zip(ids, rows)], 201
 
 class ItemResource(Resource):
     def get(self, item_id):
@@ -21,15 +96,19 @@ class ItemResource(Resource):
         return item.to_dict(), 200
 
     def put(self, item_id):
-        item = Item.query.get_or_404(item_id)
         data = request.json
-        item.name = data['name']
-        item.description = data.get('description', '')
-        db.session.commit()
-        return item.to_dict(), 200
+        name, description = data['name'], data.get('description', '')
+
+        def update():
+            item = Item.query.get_or_404(item_id)
+            item.name = name
+            item.description = description
+            db.session.flush()
+            return item.to_dict()
+        return run_write(db, update), 200
 
     def delete(self, item_id):
-        item = Item.query.get_or_404(item_id)
-        db.session.delete(item)
-        db.session.commit()
+        def remove():
+            db.session.delete(Item.query.get_or_404(item_id))
+        run_write(db, remove)
         return '', 204
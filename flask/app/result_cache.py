@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# The disk tier may be shared by several processes; its index picks up their entries this often (s)
+DISK_RESCAN_INTERVAL = 300
+# Temporary files older than this are left over from interrupted writes
+STALE_TEMP_AGE = 3600
+
+
+class ResultCache:
+    def __init__(self, max_entries=1024, ttl=3600, disk_dir=None, disk_max_entries=100000,
+                 disk_max_bytes=256 * 1024 * 1024):
+        """
+        Content-addressed cache of classification results.
+
+        The disk tier is bounded too: expired entries are swept when the cache starts and on
+        every put, after which the oldest entries are removed until both disk limits hold.
+
+        Args:
+            max_entries (int): Maximum number of results kept in memory (LRU)
+            ttl (int): Seconds a result stays valid
+            disk_dir (str): Optional directory for a second tier that survives restarts
+            disk_max_entries (int): Maximum number of results kept on disk
+            disk_max_bytes (int): Maximum total size of the results kept on disk
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Disk entries, oldest first: key -> (stored_at, size in bytes)
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_scanned_at = 0.0
+        self._disk_lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def key(content_digest, workout_type, age, model_version):
+        """
+        Build the cache key of one upload.
+
+        Args:
+            content_digest (str): SHA-256 hex digest of the FIT bytes
+            workout_type (str): Workout type the file is scored as
+            age: Age sent with the upload
+            model_version (str): Version of the model that scores it
+        """
+        parts = [content_digest, str(workout_type), str(age), str(model_version)]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or an expired entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] + self.ttl > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if stored['stored_at'] + self.ttl <= now:
+            with self._disk_lock:
+                self._forget_disk(key)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        self._remember(key, stored['stored_at'], stored['value'])
+        return stored['value']
+
+    def put(self, key, value):
+        """Store a JSON-serialisable value under key"""
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps({'stored_at': stored_at, 'value': value}).encode("utf-8")
+            # Write to a temporary file first so readers never see a partial entry
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+
+            with self._disk_lock:
+                self._forget_disk(key)
+                self._disk_entries[key] = (stored_at, len(data))
+                self._disk_bytes += len(data)
+                rescan = stored_at - self._disk_scanned_at > DISK_RESCAN_INTERVAL
+                if not rescan:
+                    self._evict_disk(stored_at)
+            if rescan:
+                self._scan_disk()
+
+    def _remember(self, key, stored_at, value):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget_disk(self, key):
+        # Called with _disk_lock held
+        previous = self._disk_entries.pop(key, None)
+        if previous is not None:
+            self._disk_bytes -= previous[1]
+
+    def _evict_disk(self, now):
+        # Called with _disk_lock held; entries are in storage order, so expired ones come first
+        while self._disk_entries:
+            key, (stored_at, size) = next(iter(self._disk_entries.items()))
+            if (stored_at + self.ttl > now and len(self._disk_entries) <= self.disk_max_entries
+                    and self._disk_bytes <= self.disk_max_bytes):
+                break
+            self._forget_disk(key)
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _scan_disk(self):
+        """Rebuild the disk index from the directory, then sweep expired and excess entries"""
+        now = time.time()
+        found = []
+        for shard in os.scandir(self.disk_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(".json"):
+                    # Entries are written in one replace, so the modification time is stored_at
+                    found.append((stat.st_mtime, entry.name[:-len(".json")], stat.st_size))
+                elif entry.name.endswith(".tmp") and stat.st_mtime + STALE_TEMP_AGE < now:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+        found.sort()
+        with self._disk_lock:
+            self._disk_entries = OrderedDict((key, (stored_at, size)) for stored_at, key, size in found)
+            self._disk_bytes = sum(size for _, _, size in found)
+            self._disk_scanned_at = now
+            self._evict_disk(now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,35 @@
+from flask import Blueprint, request, jsonify, current_app
+
+score_bp = Blueprint('score', __name__)
+
+
+@score_bp.route('/score/batch', methods=['POST'])
+def score_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+
+    workout_type = data.get('workout_type', data.get('workoutType'))
+    workouts = data.get('workouts')
+    if not workout_type or not isinstance(workouts, list):
+        return jsonify({'error': "Both 'workout_type' and a 'workouts' list are required"}), 400
+
+    max_batch_size = current_app.config['MAX_SCORE_BATCH_SIZE']
+    if len(workouts) > max_batch_size:
+        return jsonify({'error': f'At most {max_batch_size} workouts can be scored per request'}), 413
+
+    scorer = current_app.extensions.get('inference_pool') or current_app.extensions['model_registry']
+    try:
+        percentiles = scorer.predict_percentiles(workout_type, workouts)
+    except FileNotFoundError:
+        return jsonify({'error': f'No model for workout type {workout_type}'}), 404
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': 'Invalid workouts', 'details': str(e)}), 400
+    except (TimeoutError, RuntimeError) as e:
+        return jsonify({'error': 'Inference is temporarily unavailable', 'details': str(e)}), 503
+
+    return jsonify({
+        'workout_type': workout_type,
+        'count': len(percentiles),
+        'percentiles': percentiles.tolist()
+    }), 200
@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Set within write_intent(), so the SQLite begin listener takes the write lock up front
+_write_intent = threading.local()
+
+
+@contextmanager
+def write_intent():
+    """Begin the SQLite transactions of this thread with BEGIN IMMEDIATE within the block"""
+    _write_intent.active = True
+    try:
+        yield
+    finally:
+        _write_intent.active = False
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database, with explicit pool sizing.
+
+    In-memory SQLite keeps its single shared connection (Flask-SQLAlchemy's StaticPool).
+
+    Args:
+        config: The app's config
+
+    Returns:
+        dict: Engine options, the configured SQLALCHEMY_ENGINE_OPTIONS taking precedence
+    """
+    options = {}
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if not (url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:')):
+        options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_timeout=config['DB_POOL_TIMEOUT'])
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def configure_sqlite(engine, journal_mode='WAL', synchronous='NORMAL', busy_timeout=5000):
+    """
+    Set the pragmas of every new connection of a SQLite engine.
+
+    WAL lets readers run next to the writer, synchronous=NORMAL only syncs the WAL at
+    checkpoints, and busy_timeout makes writers wait for the lock instead of failing.
+    Transactions are begun explicitly (the SQLAlchemy recipe for pysqlite) so SAVEPOINTs
+    work, which group commit relies on. Writes begin with BEGIN IMMEDIATE: a deferred
+    transaction that reads before it writes cannot upgrade to the write lock once another
+    writer has committed, and fails with "database is locked" without waiting for
+    busy_timeout. Reads keep the plain deferred BEGIN.
+
+    Args:
+        engine: SQLAlchemy engine of a SQLite database
+        journal_mode (str): PRAGMA journal_mode
+        synchronous (str): PRAGMA synchronous
+        busy_timeout (int): PRAGMA busy_timeout in milliseconds
+    """
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        # First, so switching a new database to WAL waits for a concurrently starting process
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE" if getattr(_write_intent, 'active', False) else "BEGIN")
+
+
+class GroupCommitter:
+    def __init__(self, app, db, window=0.005, max_batch=256):
+        """
+        Coalesce the writes of concurrent requests into one transaction.
+
+        A write waits at most `window` seconds for others to join it; the batch then runs
+        in one transaction with every write in its own SAVEPOINT, so a failing write is
+        rolled back and reported to its own request only, and everything else is committed
+        (and synced) once.
+
+        Args:
+            app: Flask app the writes run in (an app context of the committer thread)
+            db: Flask-SQLAlchemy extension
+            window (float): Seconds a batch stays open for more writes
+            max_batch (int): Writes per transaction
+        """
+        self.app = app
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, write):
+        """
+        Run write() in the next group transaction and wait until it is committed.
+
+        Args:
+            write: Callable changing db.session without committing; runs in another thread,
+                so it must not use the request
+
+        Returns:
+            What write() returned
+
+        Raises:
+            The exception of write(), or of the commit
+        """
+        future = Future()
+        self._queue.put((write, future))
+        return future.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._queue.put(None)
+                    break
+                batch.append(entry)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        session = self.db.session
+        with self.app.app_context(), write_intent():
+            outcomes = []
+            for write, future in batch:
+                try:
+                    with session.begin_nested():
+                        result = write()
+                except Exception as e:
+                    outcomes.append((future, None, e))
+                else:
+                    outcomes.append((future, result, None))
+            try:
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                outcomes = [(future, None, error or e) for future, _, error in outcomes]
+            finally:
+                session.remove()
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def run_write(db, write):
+    """
+    Run write() and commit it, through the app's GroupCommitter when GROUP_COMMIT is on.
+
+    Args:
+        db: Flask-SQLAlchemy extension
+        write: Callable changing db.session without committing (see GroupCommitter.submit)
+
+    Returns:
+        What write() returned
+    """
+    committer = current_app.extensions.get('group_commit')
+    if committer is not None:
+        return committer.submit(write)
+    if db.session().in_transaction():
+        # End the request's read transaction, the write has to begin its own
+        db.session.commit()
+    with write_intent():
+        try:
+            result = write()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return result
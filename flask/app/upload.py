@@ -1,44 +1,104 @@
 import sys
 import os
+import hashlib
+import logging
+import queue
+import tempfile
 
 base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 sys.path.insert(0, base_dir)
 from predictor.scripts.classify_user import classify_user
-from flask import Blueprint, request, jsonify
+from predictor.scripts.telemetry import timed
+from flask import Blueprint, Request, request, jsonify, current_app
 
 upload_bp = Blueprint('upload', __name__)
+logger = logging.getLogger(__name__)
 
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+def classify_upload(fit_source, workout_type, age, registry=None, pool=None, cache=None, cache_key=None):
+    """
+    Run classify_user in the web process, or in an inference worker when a pool is given,
+    and store the result in the cache when a cache key is given.
+    """
+    if pool is not None:
+        if hasattr(fit_source, 'read'):
+            fit_source = fit_source.read()
+        percentile, recommendations = pool.classify(fit_source, workout_type, age)
+    else:
+        percentile, recommendations = classify_user(fit_source, workout_type, age, registry=registry)
+
+    if cache is not None and cache_key is not None:
+        cache.put(cache_key, {'percentile': percentile, 'rec': recommendations})
+    return percentile, recommendations
+
+
+def _result_cache_key(stream, workout_type, age, registry):
+    """Hash the upload and the model it would be scored with; None if the result must not be cached"""
+    try:
+        model_version = registry.model_version(workout_type)
+    except FileNotFoundError:
+        return None
+
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(1 << 16), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return current_app.extensions['result_cache'].key(digest.hexdigest(), workout_type, age, model_version)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Keep uploads in memory and only spool to a temporary file above UPLOAD_SPOOL_THRESHOLD
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_THRESHOLD'], mode='w+b')
 
 
 @upload_bp.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part in the request'}), 400
+    # Receiving the multipart body (spooled to memory or a temporary file) and hashing it
+    with timed('upload_save') as stage:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file part in the request'}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+
+        workout_type = stage.workout_type = request.form.get('workout_type',
+                                                             request.form.get('workoutType', 'Strength'))
+        age = request.form.get('age', 25)
+        registry = current_app.extensions.get('model_registry')
+        pool = current_app.extensions.get('inference_pool')
+        cache = current_app.extensions.get('result_cache')
+        file.stream.seek(0)
 
-    file = request.files['file']
-    print("Workout Type from frontend:", request.form.get('workoutType'))
-    print()
-    print()
-    print()
-    print()
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+        # Retried or re-submitted activities are answered without parsing or scoring them again
+        cache_key = _result_cache_key(file.stream, workout_type, age, registry) if cache is not None else None
+    logger.debug("Upload received", extra={'workout_type': workout_type, 'file_name': file.filename})
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return jsonify({
+                'message': 'File processed successfully',
+                'percentile': cached['percentile'],
+                'rec': cached['rec']
+            }), 200, {'X-Cache': 'HIT'}
 
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+    if request.args.get('async', request.form.get('async', '')).lower() in ('1', 'true', 'yes'):
+        # The request stream is closed once we return, so the job gets the bytes
+        jobs = current_app.extensions['classification_jobs']
+        try:
+            job_id = jobs.submit(classify_upload, file.stream.read(), workout_type, age,
+                                 registry=registry, pool=pool, cache=cache, cache_key=cache_key)
+        except queue.Full:
+            return jsonify({'error': 'Too many pending classification jobs, try again later'}), 429, \
+                {'Retry-After': '1'}
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202, {'Location': f'/jobs/{job_id}'}
 
     try:
-        percentile, recommendations = classify_user(file_path, request.form.get('workout_type',
-                                                                                request.form.get('workoutType',
-                                                                                                 'Strength')),
-                                                    request.form.get('age', 25))
-        print(percentile, recommendations)
-        for f in os.listdir(UPLOAD_FOLDER):
-            file_path = os.path.join(UPLOAD_FOLDER, f)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
+        percentile, recommendations = classify_upload(file.stream, workout_type, age,
+                                                      registry=registry, pool=pool,
+                                                      cache=cache, cache_key=cache_key)
+        logger.info("Upload classified", extra={'workout_type': workout_type, 'percentile': percentile})
         return jsonify({
             'message': 'File processed successfully',
             'percentile': percentile,
@@ -46,5 +106,20 @@ def upload_file():
         }), 200
 
     except Exception as e:
-        print(f"Error processing file: {str(e)}")
+        logger.exception("Error processing upload", extra={'workout_type': workout_type})
         return jsonify({'error': 'An error occurred while processing the request', 'details': str(e)}), 500
+
+
+@upload_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = current_app.extensions['classification_jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    response = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == 'done':
+        percentile, recommendations = job['result']
+        response.update({'message': 'File processed successfully', 'percentile': percentile, 'rec': recommendations})
+    elif job['status'] == 'failed':
+        response.update({'error': 'An error occurred while processing the request', 'details': job['error']})
+    return jsonify(response), 200
@@ -1,12 +1,32 @@
+import os
+from flask import Config
 from app import create_app, db
 from app.models import Item
+from app.storage import write_intent
 from flask_cors import CORS
 
-app = create_app()
-CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-with app.app_context():
-    db.create_all()
+def build_app(config=None):
+    """
+    The app as served by run.py and wsgi.py, with its tables created.
 
+    FLASK_<KEY> environment variables override the defaults (values are parsed as JSON),
+    e.g. FLASK_INFERENCE_PROCESSES=2; the config argument overrides both.
+    """
+    settings = Config(os.getcwd())
+    settings.from_prefixed_env()
+    settings.update(config or {})
+    app = create_app(settings)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+
+    # Under the write lock, so workers starting together do not race to create the tables
+    with app.app_context(), write_intent():
+        db.create_all()
+    return app
+
+
+# The app is only created under the main guard: spawned inference and FIT parser
+# processes import this module again as __mp_main__ and must not build their own app
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server; in production serve wsgi:app with a WSGI server (see wsgi.py)
+    build_app().run(debug=True)
@@ -0,0 +1,12 @@
+# Production entry point. Serve it from the flask directory with a WSGI server, e.g.
+#
+#     waitress-serve --threads 8 --port 5000 wsgi:app
+#     gunicorn --workers 2 --threads 8 --bind 0.0.0.0:5000 wsgi:app
+#
+# Configure it with FLASK_<KEY> environment variables, e.g. FLASK_INFERENCE_PROCESSES=2.
+# Every gunicorn worker builds its own app, with its own inference and parser pools
+# (INFERENCE_PROCESSES and BULK_PARSE_PROCESSES per worker). Do not use --preload: the
+# pools' threads would not survive the fork into the workers.
+from run import build_app
+
+app = build_app()
@@ -0,0 +1,294 @@
+import os
+import io
+import sys
+import json
+import glob
+import time
+import timeit
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.model_registry import WORKOUT_TYPES
+
+PREDICTOR_DIR = os.path.join(base_dir, "predictor")
+FIT_FILES = [os.path.join(PREDICTOR_DIR, "teon.fit"), os.path.join(PREDICTOR_DIR, "teon2.fit")]
+DEFAULT_BASELINE = os.path.join(PREDICTOR_DIR, "benchmarks", "baseline.json")
+
+# Fixed workout scored by the model benchmarks; the batch benchmark scales it by +-20%
+SAMPLE_WORKOUT = {'HRmax': 190.0, 'HR%': 70.0, 'TLI': 3000.0, 'MET': 12.0, 'WEI': 5.0}
+BATCH_SIZE = 1000
+# Benchmarks below a millisecond vary by 2x between runs on a loaded machine; they only
+# regress when they get slower by more than this
+SUB_MS_MIN_DELTA_MS = 0.5
+
+
+def measure(func, repeat=7, min_run_time=0.2):
+    """
+    Time func() like timeit: calls per run are calibrated so that a run takes at least
+    min_run_time, and the statistics are per call over `repeat` runs after one warm-up call.
+
+    Args:
+        func: Callable without arguments
+        repeat (int): Number of timed runs
+        min_run_time (float): Shortest run in seconds
+
+    Returns:
+        dict: median_ms, min_ms and max_ms per call, calls per run and runs
+    """
+    func()
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_run_time or number >= 1 << 20:
+            break
+        number = max(number * 2, int(number * min_run_time / max(elapsed, 1e-9)))
+    runs = np.array([elapsed] + timer.repeat(repeat - 1, number)) / number * 1000
+    return {'median_ms': float(np.median(runs)), 'min_ms': float(runs.min()), 'max_ms': float(runs.max()),
+            'number': number, 'repeat': repeat}
+
+
+def bench_parse(repeat):
+    from predictor.scripts.fit_to_csv import parse_fit_file
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for fit_path in FIT_FILES:
+            name = os.path.splitext(os.path.basename(fit_path))[0]
+            csv_path = os.path.join(temp_dir, f"{name}.csv")
+
+            def parse():
+                parse_fit_file(fit_path, csv_path)
+                os.remove(csv_path)
+            results[f"parse_fit_file/{name}"] = measure(parse, repeat)
+    return results
+
+
+def bench_models(repeat, model_dir, engine):
+    from predictor.scripts.create_models import load_workout_model
+
+    results = {}
+    batch = np.tile(np.array([list(SAMPLE_WORKOUT.values())]), (BATCH_SIZE, 1))
+    batch *= np.random.default_rng(0).uniform(0.8, 1.2, batch.shape)
+    for workout_type in WORKOUT_TYPES:
+        model_base_path = os.path.join(model_dir, workout_type)
+        results[f"load_workout_model/{workout_type}"] = measure(
+            lambda: load_workout_model(model_base_path, engine=engine), repeat)
+
+        model = load_workout_model(model_base_path, engine=engine)
+        results[f"predict_percentile/{workout_type}"] = measure(
+            lambda: model.predict_percentile(SAMPLE_WORKOUT), repeat)
+        results[f"predict_percentiles_batch{BATCH_SIZE}/{workout_type}"] = measure(
+            lambda: model.predict_percentiles(batch), repeat)
+        results[f"get_improvement_recommendations/{workout_type}"] = measure(
+            lambda: model.get_improvement_recommendations(SAMPLE_WORKOUT), repeat)
+    return results
+
+
+def bench_training(epochs, data_dir):
+    from predictor.scripts.create_models import WorkoutPercentileModel
+    import tensorflow as tf
+
+    results = {}
+    for csv_path in sorted(glob.glob(os.path.join(data_dir, "*_analysis.csv"))):
+        workout_type = os.path.basename(csv_path)[:-len("_analysis.csv")]
+        tf.keras.utils.set_random_seed(0)
+        # One run: training is seconds long and its first run is the cost that matters
+        started = time.perf_counter()
+        WorkoutPercentileModel(csv_path, epochs=epochs)
+        elapsed = (time.perf_counter() - started) * 1000
+        results[f"train_epochs{epochs}/{workout_type}"] = {
+            'median_ms': elapsed, 'min_ms': elapsed, 'max_ms': elapsed, 'number': 1, 'repeat': 1}
+    return results
+
+
+def bench_upload(repeat, model_dir, engine):
+    sys.path.insert(0, os.path.join(base_dir, "flask"))
+    from app import create_app
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'MODEL_DIR': model_dir, 'MODEL_ENGINE': engine,
+                      'RESULT_CACHE_SIZE': 0, 'BULK_PARSE_PROCESSES': 0})
+    client = app.test_client()
+    results = {}
+    for fit_path in FIT_FILES:
+        with open(fit_path, "rb") as file:
+            fit_bytes = file.read()
+        name = os.path.splitext(os.path.basename(fit_path))[0]
+
+        def upload():
+            response = client.post('/upload', data={'workout_type': 'Running', 'age': 25,
+                                                    'file': (io.BytesIO(fit_bytes), 'activity.fit')},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200, response.get_data(as_text=True)
+        results[f"upload/{name}"] = measure(upload, repeat)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=base_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count(), 'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def _run_group(group, repeat, epochs, model_dir, data_dir, engine):
+    if group == "parse":
+        return bench_parse(repeat)
+    if group == "models":
+        return bench_models(repeat, model_dir, engine)
+    if group == "upload":
+        return bench_upload(repeat, model_dir, engine)
+    if group == "training":
+        return bench_training(epochs, data_dir)
+    raise ValueError(f"Unknown benchmark group {group}")
+
+
+def run_benchmarks(groups, repeat=7, epochs=2, model_dir=None, data_dir=None, engine="auto"):
+    """
+    Run the benchmark groups, each in a fresh interpreter.
+
+    Groups must not see each other's imports: importing TensorFlow (done by the upload and
+    training groups) alone changes the NumPy inference timings by ~40%.
+
+    Args:
+        groups (list): Any of "parse", "models", "upload" and "training"
+        repeat (int): Timed runs per benchmark
+        epochs (int): Training epochs of the training benchmarks
+        model_dir (str): Directory with the model artifacts (predictor/models by default)
+        data_dir (str): Directory with the *_analysis.csv files (predictor/sorted_and_calculated_data)
+        engine (str): Inference engine passed to load_workout_model
+
+    Returns:
+        dict: {'environment': ..., 'results': {benchmark name: timing dict}}
+    """
+    model_dir = model_dir or os.path.join(PREDICTOR_DIR, "models")
+    data_dir = data_dir or os.path.join(PREDICTOR_DIR, "sorted_and_calculated_data")
+    results = {}
+    for group in groups:
+        print(f"Running {group} benchmarks...")
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results.update(executor.submit(_run_group, group, repeat, epochs, model_dir, data_dir, engine).result())
+    return {'environment': environment(), 'results': results}
+
+
+def merge_rounds(rounds):
+    """
+    Combine the results of repeated suite runs, keeping per benchmark the run with the median
+    min_ms; a burst of load on the machine then only affects the round it happened in.
+
+    Args:
+        rounds (list): 'results' dicts of run_benchmarks
+
+    Returns:
+        dict: Benchmark name -> timing dict
+    """
+    merged = {}
+    for name in rounds[0]:
+        timings = sorted((results[name] for results in rounds if name in results), key=lambda t: t['min_ms'])
+        merged[name] = dict(timings[len(timings) // 2], rounds=len(timings))
+    return merged
+
+
+def compare(results, baseline, threshold=0.25, min_delta_ms=0.05, sub_ms_min_delta_ms=SUB_MS_MIN_DELTA_MS):
+    """
+    Compare the fastest runs (min_ms) against a baseline.
+
+    The minimum is what the code costs when nothing else competes for the CPU, so it is
+    far less noisy than the median. A benchmark regressed when its min_ms is more than
+    `threshold` (relative) and more than min_delta_ms (absolute, so microsecond jitter
+    does not count) above the baseline; benchmarks whose baseline is below a millisecond
+    must also be more than sub_ms_min_delta_ms slower.
+
+    Args:
+        results (dict): Benchmark name -> timing dict of this run
+        baseline (dict): Benchmark name -> timing dict of the baseline
+        threshold (float): Allowed relative slowdown, 0.25 is 25%
+        min_delta_ms (float): Slowdowns below this many milliseconds are ignored
+        sub_ms_min_delta_ms (float): The same for benchmarks with a sub-millisecond baseline
+
+    Returns:
+        list: (name, baseline ms, current ms, ratio, regressed) for the common benchmarks
+    """
+    rows = []
+    for name in sorted(set(results) & set(baseline)):
+        old, new = baseline[name]['min_ms'], results[name]['min_ms']
+        ratio = new / old if old > 0 else float('inf')
+        floor = max(min_delta_ms, sub_ms_min_delta_ms) if old < 1 else min_delta_ms
+        regressed = ratio > 1 + threshold and new - old > floor
+        rows.append((name, old, new, ratio, regressed))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsing, model loading, scoring, upload and training")
+    parser.add_argument("--groups", nargs="+", choices=["parse", "models", "upload", "training"],
+                        default=["parse", "models", "upload", "training"])
+    parser.add_argument("--repeat", type=int, default=7, help="Timed runs per benchmark")
+    parser.add_argument("--epochs", type=int, default=2, help="Epochs of the training benchmarks")
+    parser.add_argument("--engine", default="auto", help="Inference engine (auto, numpy, keras, empirical)")
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--data-dir", default=None)
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore slowdowns below this")
+    parser.add_argument("--sub-ms-min-delta-ms", type=float, default=SUB_MS_MIN_DELTA_MS,
+                        help="Ignore slowdowns below this for benchmarks with a sub-millisecond baseline")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="Run the suite this many times and keep the median round per benchmark")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    reports = [run_benchmarks(args.groups, args.repeat, args.epochs, args.model_dir, args.data_dir, args.engine)
+               for _ in range(args.rounds)]
+    report = {'environment': reports[0]['environment'], 'results': merge_rounds([r['results'] for r in reports])}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.update_baseline:
+        baseline = {'environment': report['environment'], 'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as file:
+                baseline['results'] = json.load(file)['results']
+        # Groups that were not run keep their previous baseline
+        baseline['results'].update(report['results'])
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        for name, timing in sorted(report['results'].items()):
+            print(f"{timing['min_ms']:12.3f} ms  {name}")
+        print(f"No baseline at {args.baseline}, run with --update-baseline to create it")
+        sys.exit(0)
+
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    rows = compare(report['results'], baseline['results'], args.threshold, args.min_delta_ms,
+                   args.sub_ms_min_delta_ms)
+    print(f"\n{'baseline ms':>12} {'current ms':>12} {'ratio':>7}  benchmark (fastest run)")
+    for name, old, new, ratio, regressed in rows:
+        print(f"{old:12.3f} {new:12.3f} {ratio:7.2f}  {name}{'  REGRESSION' if regressed else ''}")
+    for name in sorted(set(report['results']) - set(baseline['results'])):
+        print(f"{'-':>12} {report['results'][name]['min_ms']:12.3f} {'-':>7}  {name} (not in baseline)")
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks are more than {args.threshold:.0%} slower than the baseline")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline}")
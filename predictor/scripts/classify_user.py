@@ -1,17 +1,36 @@
-import os
-import pandas as pd
-from predictor.scripts.fit_to_csv import parse_fit_file
+import logging
+import numpy as np
+from predictor.scripts.fit_to_csv import parse_fit_file, summarize_fit_file
 from predictor.scripts.create_models import \
     load_workout_model
+from predictor.scripts.feature_store import FEATURES, feature_values, workout_features
+from predictor.scripts.telemetry import timed
+from predictor.scripts.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+
+def calculate_formulas(df, dtype=np.float64):
+    """Add the feature columns to a DataFrame of raw workouts, see workout_features"""
+    features = workout_features(df['Age'], df['Heart Rate (bpm)'], df['Workout Duration (mins)'],
+                                df['Resting Heart Rate (bpm)'], df['Distance (km)'], dtype=dtype)
+    for i, feat in enumerate(FEATURES):
+        df[feat] = features[:, i]
+    # The product of integer heart rates and durations stays an integer column
+    if df['Heart Rate (bpm)'].dtype.kind == 'i' and df['Workout Duration (mins)'].dtype.kind == 'i':
+        df['TLI'] = df['TLI'].astype(np.int64)
+    return df
 
 
-def calculate_formulas(df):
-    df['HRmax'] = 208 - 0.7 * df['Age']
-    df['HR%'] = (df['Heart Rate (bpm)'] / df['HRmax']) * 100
-    df['TLI'] = df['Heart Rate (bpm)'] * df['Workout Duration (mins)']
-    df['MET'] = (df['Heart Rate (bpm)'] / df['Resting Heart Rate (bpm)']) * 3.5
-    df['WEI'] = (df['HR%'] * df['Distance (km)']) / df['Workout Duration (mins)']
-    return df
+def calculate_workout_metrics(summary):
+    """
+    Features of a single workout summary (see summarize_fit_file), without a DataFrame.
+
+    Returns:
+        np.ndarray: float32 array of shape (1, 5) with the columns in FEATURES order
+    """
+    return workout_features(summary['Age'], summary['Heart Rate (bpm)'], summary['Workout Duration (mins)'],
+                            summary['Resting Heart Rate (bpm)'], summary['Distance (km)'])
 
 
 def extract_latest_workout_metrics(df):
@@ -26,39 +45,70 @@ def extract_latest_workout_metrics(df):
     }
 
 
-def classify_user(path, workout_type, age):
-    parse_fit_file(path, path + ".csv", age, workout_type)
-    print(f"✅ Parsed data from 'teon' and saved to 'output.csv'")
-
-    df = pd.read_csv(path + ".csv")
-    df = calculate_formulas(df)
-    df.to_csv(path + "class.csv", index=False)
-
-    model_path = f"../models/{workout_type}"
-
-    model = load_workout_model(model_path)
+@profiled("extract_workout_features")
+def extract_workout_features(fit_source, workout_type, age, with_start_time=False):
+    """
+    Parse a FIT activity into its model features; the parse half of classify_user.
+
+    Returns:
+        list: HRmax, HR%, TLI, MET and WEI as Python floats (NaN where the file lacks data,
+            see feature_values), or (features, start time) with with_start_time (see
+            summarize_fit_file)
+    """
+    with timed("fit_parse", workout_type):
+        summary = summarize_fit_file(fit_source, age, workout_type, with_start_time=with_start_time)
+    if with_start_time:
+        summary, start_time = summary
+    with timed("feature_calc", workout_type):
+        # float32 only inside the feature kernel
+        features = feature_values(calculate_workout_metrics(summary)[0])
+    return (features, start_time) if with_start_time else features
+
+
+@profiled("classify_user")
+def classify_user(fit_source, workout_type, age, registry=None):
+    """
+    Score a FIT activity without writing anything to disk.
+
+    Args:
+        fit_source: Path to a .fit file, its bytes or a binary file-like object
+        workout_type (str): Workout type, selects the model
+        age: Age used when the FIT file has no user_profile
+        registry (ModelRegistry): Registry to take the model from (loaded from ../models if None)
+
+    Returns:
+        tuple: (percentile, recommendations dict)
+    """
+    features = extract_workout_features(fit_source, workout_type, age)
+
+    if registry is not None:
+        model = registry.get(workout_type)
+    else:
+        model_path = f"../models/{workout_type}"
+        model = load_workout_model(model_path)
     if model is None:
-        print(f"❌ Failed to load model for {workout_type}")
+        logger.error("Failed to load model", extra={'workout_type': workout_type})
         return
 
-    workout_data = extract_latest_workout_metrics(df)
-    print(f"📊 Latest workout data extracted: {workout_data}")
+    percentiles, recommendations = model.evaluate(np.array([features]))
+    percentile, recommendations = float(percentiles[0]), recommendations[0]
 
-    percentile = model.predict_percentile(workout_data)
-    recommendations = model.get_improvement_recommendations(workout_data)
-
-    print(f"\n📊 Your workout is in the {percentile}th percentile.\n")
-    print("💡 Recommendations:")
-    for key, value in recommendations.items():
-        print(f"- {key}: {value}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Classified workout", extra={'workout_type': workout_type,
+                                                  'features': dict(zip(FEATURES, features)),
+                                                  'percentile': percentile, 'recommendations': recommendations})
     return percentile, recommendations
 
 
 def test():
+    # The CSV round trip is only for this script; serving stays NumPy-only
+    import pandas as pd
+
     parse_fit_file("../teon2.fit", "output.csv")
     print(f"✅ Parsed data from 'teon' and saved to 'output.csv'")
 
-    df = pd.read_csv("output.csv")
+    with timed("csv_read", "Running"):
+        df = pd.read_csv("output.csv")
     df = calculate_formulas(df)
     df.to_csv("leon_class.csv", index=False)
 
@@ -77,8 +127,8 @@ def test():
     print(f"📊 Latest workout data extracted: {workout_data}")
 
     # Predict percentile and print recommendations
-    percentile = model.predict_percentile(workout_data)
-    recommendations = model.get_improvement_recommendations(workout_data)
+    percentiles, recommendations = model.evaluate([workout_data])
+    percentile, recommendations = float(percentiles[0]), recommendations[0]
 
     print(f"\n📊 Your workout is in the {percentile}th percentile.\n")
     print("💡 Recommendations:")
@@ -1,44 +1,193 @@
 import os
+import sys
 import glob
+import json
+import time
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import joblib
-import pandas as pd
 import numpy as np
-import tensorflow as tf
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from scipy.stats import percentileofscore
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.numpy_inference import export_numpy_model, load_numpy_model, load_empirical_model, \
+    numpy_model_path, rank_percentiles, update_numpy_model
+from predictor.scripts.quantile_sketch import ReferenceSketch, reference_statistics
+from predictor.scripts.feature_store import feature_matrix_path, load_feature_matrix, file_sha256
+from predictor.scripts.telemetry import timed
+
+
+def workouts_to_matrix(workouts, features, allow_missing=False):
+    """
+    Convert workouts to a 2-D feature matrix.
+
+    Args:
+        workouts: A list of dicts, a single dict, a 2-D array (columns in the
+            order of features) or a DataFrame with the feature columns
+        features (list): Feature names, e.g. ['HRmax', 'HR%', 'TLI', 'MET', 'WEI']
+        allow_missing (bool): Keep rows with missing (None/NaN) or infinite values
+            instead of raising ValueError
+
+    Returns:
+        np.ndarray: Array of shape (n, len(features)), (0, len(features)) for no workouts
+    """
+    if hasattr(workouts, 'columns'):
+        input_data = workouts[features].to_numpy(dtype=np.float64)
+    else:
+        if isinstance(workouts, dict):
+            workouts = [workouts]
+        if len(workouts) == 0:
+            return np.empty((0, len(features)))
+        if isinstance(workouts[0], dict):
+            input_data = np.array([[workout[feat] for feat in features] for workout in workouts], dtype=np.float64)
+        else:
+            input_data = np.asarray(workouts, dtype=np.float64)
+            if input_data.ndim == 1:
+                input_data = input_data.reshape(1, -1)
+            if input_data.ndim != 2 or input_data.shape[1] != len(features):
+                raise ValueError(f"Expected workouts with {len(features)} features, got shape {input_data.shape}")
+
+    if not allow_missing and not np.isfinite(input_data).all():
+        rows = np.flatnonzero(~np.isfinite(input_data).all(axis=1))
+        raise ValueError(f"Workouts {rows[:10].tolist()} have missing or non-finite feature values")
+    return input_data
+
+
+# (metric, relative difference, comparison, threshold, message) - rules for the same
+# metric are mutually exclusive, diff is top_metrics[metric] - value
+RECOMMENDATION_RULES = [
+    ('HRmax', False, '>', 5, "Povečaj največji srčni utrip za {diff:.1f} utripov/min z intenzivnejšimi intervali"),
+    ('HRmax', False, '<', -5, "Tvoj HRmax je nenavadno visok – razmisli o posvetu z zdravnikom"),
+    ('HR%', False, '>', 5,
+     "Preživi več časa v višjih območjih srčnega utripa (ciljaj na {target:.1f}% maksimalnega)"),
+    ('TLI', True, '>', 0.2,
+     "Povečaj skupno obremenitev vadbe za {diff:.1%} z daljšim trajanjem ali večjo intenzivnostjo"),
+    ('MET', False, '>', 0.5, "Izberi bolj intenzivne aktivnosti za povečanje MET ocene za {diff:.1f}"),
+    ('WEI', False, '>', 0.2, "Povečaj učinkovitost vadbe z izboljšanjem tehnike ali dodajanjem upora"),
+    ('WEI', False, '<', -0.2, "Tvoj WEI je nenavadno visok – preveri, ali se ne pretreniraš"),
+]
+
+# General recommendation by percentile band: below 50, below 75, 75 and above
+GENERAL_RECOMMENDATION_BOUNDS = [50, 75]
+GENERAL_RECOMMENDATIONS = [
+    "Najprej se osredotoči na doslednost – ciljaj na redne vadbe, preden povečaš intenzivnost",
+    "Poskusi vključiti intervalni trening za izboljšanje kakovosti vadbe",
+    "Ohrani svojo odlično vadbeno rutino z ustreznim počitkom",
+]
+
+
+def recommend(input_data, percentiles, features, top_metrics):
+    """
+    Apply RECOMMENDATION_RULES to a batch of already scored workouts.
+
+    Args:
+        input_data (np.ndarray): Array of shape (n, len(features))
+        percentiles (np.ndarray): Percentile of each workout
+        features (list): Feature names, in the column order of input_data
+        top_metrics (dict): Reference metrics of the top workouts
+
+    Returns:
+        list: One recommendations dict per workout
+    """
+    recommendations = [{} for _ in range(len(input_data))]
+
+    for metric, relative, comparison, threshold, message in RECOMMENDATION_RULES:
+        target = top_metrics[metric]
+        diffs = target - input_data[:, features.index(metric)]
+        if relative:
+            diffs = diffs / target
+        mask = diffs > threshold if comparison == '>' else diffs < threshold
+
+        # Only format messages for the workouts the rule fires on
+        for i in np.flatnonzero(mask):
+            recommendations[i][metric] = message.format(diff=diffs[i], target=target)
+
+    bands = np.searchsorted(GENERAL_RECOMMENDATION_BOUNDS, percentiles, side='right')
+    for workout_recommendations, band in zip(recommendations, bands):
+        workout_recommendations['general'] = GENERAL_RECOMMENDATIONS[band]
+
+    return recommendations
+
+
+def read_feature_chunks(data_path, features, chunksize):
+    """
+    Stream the feature columns of a CSV or feature matrix without loading the whole file.
+
+    Args:
+        data_path (str): Path to the CSV file or the .npy feature matrix
+        features (list): Feature columns to read
+        chunksize (int): Rows per chunk
+
+    Yields:
+        tuple: (row offset of the chunk, np.ndarray of shape (rows, len(features)))
+    """
+    if data_path.endswith(".npy"):
+        matrix = load_feature_matrix(data_path, features)
+        for offset in range(0, len(matrix), chunksize):
+            yield offset, np.asarray(matrix[offset:offset + chunksize], dtype=np.float64)
+        return
+
+    import pandas as pd
+    offset = 0
+    for chunk in pd.read_csv(data_path, usecols=features, chunksize=chunksize):
+        yield offset, chunk[features].to_numpy(dtype=np.float64)
+        offset += len(chunk)
+
+
+def _validation_rows(offset, count):
+    # Streaming training holds out every fifth row of the file for validation
+    return (np.arange(offset, offset + count) % 5) == 0
 
 
 class WorkoutPercentileModel:
-    def __init__(self, data_path):
+    def __init__(self, data_path, epochs=100, batch_size=32, chunksize=None):
         """
         Initialize the model with workout data from a CSV file.
 
         Args:
-            data_path (str): Path to the CSV file containing workout data
+            data_path (str): Path to the CSV file containing workout data, or to its
+                <type>_features.npy matrix (memory-mapped, no CSV parsing)
+            epochs (int): Maximum number of training epochs
+            batch_size (int): Training batch size
+            chunksize (int): Stream the CSV in chunks of this many rows instead of loading
+                it, for datasets larger than memory (reference statistics come from the sketch)
         """
-        # Load and prepare data
-        df = pd.read_csv(data_path)
         self.features = ['HRmax', 'HR%', 'TLI', 'MET', 'WEI']
-        self.workout_data = df[self.features]
-
-        # Calculate percentiles for each workout in the dataset
-        scaler = StandardScaler()
-        scaled_data = scaler.fit_transform(self.workout_data)
-        composite_scores = scaled_data.mean(axis=1)
-        self.percentiles = np.array([percentileofscore(composite_scores, score)
-                                     for score in composite_scores])
-
-        # Store metrics of top 10% workouts for comparison
-        top_10_threshold = np.percentile(self.percentiles, 90)
-        self.top_workouts = self.workout_data[self.percentiles >= top_10_threshold]
-        self.top_metrics = {
-            'HRmax': self.top_workouts['HRmax'].median(),
-            'HR%': self.top_workouts['HR%'].median(),
-            'TLI': self.top_workouts['TLI'].median(),
-            'MET': self.top_workouts['MET'].median(),
-            'WEI': self.top_workouts['WEI'].median()
-        }
+        self.chunksize = chunksize
+        if chunksize is not None:
+            self._init_streaming(data_path, epochs, batch_size)
+            return
+
+        # Training-only dependencies; serving a NumPy export does not need them
+        import pandas as pd
+        from sklearn.model_selection import train_test_split
+        from sklearn.preprocessing import StandardScaler
+
+        # Load and prepare data
+        if data_path.endswith(".npy"):
+            self.workout_data = pd.DataFrame(load_feature_matrix(data_path, self.features),
+                                             columns=self.features, dtype=np.float64)
+        else:
+            df = pd.read_csv(data_path)
+            self.workout_data = df[self.features]
+
+        # Calculate percentiles for each workout in the dataset and store
+        # metrics of top 10% workouts for comparison
+        self.reference_data = self.workout_data.to_numpy(dtype=np.float64)
+        reference = reference_statistics(self.reference_data, self.features)
+        self.composite_mean = reference['composite_mean']
+        self.composite_scale = reference['composite_scale']
+        self.sorted_scores = reference['sorted_scores']
+        self.percentiles = reference['percentiles']
+        self.top_workouts = self.workout_data[reference['top_mask']]
+        self.top_metrics = reference['top_metrics']
+
+        # Sketch of the reference workouts for later online updates
+        self.reference_sketch = ReferenceSketch(len(self.features))
+        self.reference_sketch.update(self.reference_data)
 
         # Prepare data for neural network
         self.X = self.workout_data.values
@@ -55,10 +204,30 @@ class WorkoutPercentileModel:
 
         # Build and train model
         self.model = self._build_model()
-        self._train_model()
+        self._train_model(epochs=epochs, batch_size=batch_size)
+
+    def _init_streaming(self, data_path, epochs, batch_size):
+        """Single pass over the CSV for the reference sketch and the input scaler, then stream training"""
+        from sklearn.preprocessing import StandardScaler
+
+        self.reference_sketch = ReferenceSketch(len(self.features))
+        self.scaler = StandardScaler()
+        for offset, chunk in read_feature_chunks(data_path, self.features, self.chunksize):
+            self.reference_sketch.update(chunk)
+            self.scaler.partial_fit(chunk[~_validation_rows(offset, len(chunk))])
+
+        reference = self.reference_sketch.statistics(self.features)
+        self.composite_mean = reference['composite_mean']
+        self.composite_scale = reference['composite_scale']
+        self.sorted_scores = reference['sorted_scores']
+        self.top_metrics = reference['top_metrics']
+
+        self.model = self._build_model()
+        self._train_streaming(data_path, epochs=epochs, batch_size=batch_size)
 
     def _build_model(self):
         """Build the neural network architecture"""
+        import tensorflow as tf
         model = tf.keras.Sequential([
             tf.keras.layers.Dense(64, activation='relu', input_shape=(5,)),
             tf.keras.layers.Dropout(0.2),
@@ -73,6 +242,7 @@ class WorkoutPercentileModel:
 
     def _train_model(self, epochs=100, batch_size=32):
         """Train the neural network"""
+        import tensorflow as tf
         early_stopping = tf.keras.callbacks.EarlyStopping(
             monitor='val_loss', patience=10, restore_best_weights=True)
 
@@ -84,6 +254,38 @@ class WorkoutPercentileModel:
             callbacks=[early_stopping],
             verbose=0)
 
+    def _train_streaming(self, data_path, epochs=100, batch_size=32):
+        """Train the neural network on batches read chunk by chunk, labelled against the sketch"""
+        import tensorflow as tf
+
+        # Row counts from the sketch pass, so Keras knows where an epoch ends
+        train_rows = int(self.scaler.n_samples_seen_)
+        row_counts = {False: train_rows, True: self.reference_sketch.count - train_rows}
+
+        def dataset(validation):
+            def generate():
+                for offset, chunk in read_feature_chunks(data_path, self.features, self.chunksize):
+                    rows = chunk[_validation_rows(offset, len(chunk)) == validation]
+                    if len(rows):
+                        scores = ((rows - self.composite_mean) / self.composite_scale).mean(axis=1)
+                        labels = rank_percentiles(scores, self.sorted_scores) / 100
+                        yield self.scaler.transform(rows).astype(np.float32), labels.astype(np.float32)
+
+            signature = (tf.TensorSpec((None, len(self.features)), tf.float32),
+                         tf.TensorSpec((None,), tf.float32))
+            return tf.data.Dataset.from_generator(generate, output_signature=signature).unbatch() \
+                .apply(tf.data.experimental.assert_cardinality(row_counts[validation]))
+
+        early_stopping = tf.keras.callbacks.EarlyStopping(
+            monitor='val_loss', patience=10, restore_best_weights=True)
+
+        self.history = self.model.fit(
+            dataset(False).shuffle(max(self.chunksize, batch_size), seed=42).batch(batch_size),
+            validation_data=dataset(True).batch(batch_size),
+            epochs=epochs,
+            callbacks=[early_stopping],
+            verbose=0)
+
     def predict_percentile(self, new_workout):
         """
         Predict the percentile of a new workout.
@@ -95,19 +297,43 @@ class WorkoutPercentileModel:
         Returns:
             float: Percentile score (0-100)
         """
-        # Convert input to numpy array
-        if isinstance(new_workout, dict):
-            input_data = np.array([new_workout[feat] for feat in self.features]).reshape(1, -1)
-        else:
-            input_data = np.array(new_workout).reshape(1, -1)
+        return float(self.predict_percentiles([new_workout] if isinstance(new_workout, dict) else new_workout)[0])
 
-        # Scale the input
+    def predict_percentiles(self, workouts):
+        """
+        Predict the percentiles of many workouts in one call.
+
+        Args:
+            workouts: List of dicts, 2-D array (columns HRmax, HR%, TLI, MET, WEI)
+                or DataFrame with those columns
+
+        Returns:
+            np.ndarray: Percentile scores (0-100), one per workout
+        """
+        input_data = workouts_to_matrix(workouts, self.features)
+        if len(input_data) == 0:
+            return np.empty(0)
+
+        # Scale and predict the whole matrix at once
         scaled_input = self.scaler.transform(input_data)
+        percentiles = self.model.predict(scaled_input, batch_size=len(scaled_input), verbose=0)[:, 0] * 100
 
-        # Predict (output is 0-1, so we multiply by 100 to get percentile)
-        percentile = self.model.predict(scaled_input, verbose=0)[0][0] * 100
+        return np.round(percentiles.astype(np.float64), 2)
+
+    def evaluate(self, workouts):
+        """
+        Score workouts and build their recommendations with a single forward pass.
 
-        return round(percentile, 2)
+        Args:
+            workouts: List of dicts, 2-D array (columns HRmax, HR%, TLI, MET, WEI)
+                or DataFrame with those columns
+
+        Returns:
+            tuple: (np.ndarray of percentiles, list of recommendation dicts)
+        """
+        input_data = workouts_to_matrix(workouts, self.features)
+        percentiles = self.predict_percentiles(input_data)
+        return percentiles, recommend(input_data, percentiles, self.features, self.top_metrics)
 
     def get_improvement_recommendations(self, new_workout):
         """
@@ -119,56 +345,7 @@ class WorkoutPercentileModel:
         Returns:
             dict: Dictionary with recommendations for each metric
         """
-        recommendations = {}
-
-        # Compare each metric with top workouts
-        for metric in self.features:
-            current_value = new_workout[metric]
-            target_value = self.top_metrics[metric]
-
-            if metric == 'HRmax':
-                diff = target_value - current_value
-                if diff > 5:
-                    recommendations[
-                        metric] = f"Povečaj največji srčni utrip za {diff:.1f} utripov/min z intenzivnejšimi intervali"
-                elif diff < -5:
-                    recommendations[metric] = "Tvoj HRmax je nenavadno visok – razmisli o posvetu z zdravnikom"
-
-            elif metric == 'HR%':
-                diff = target_value - current_value
-                if diff > 5:
-                    recommendations[
-                        metric] = f"Preživi več časa v višjih območjih srčnega utripa (ciljaj na {target_value:.1f}% maksimalnega)"
-
-            elif metric == 'TLI':
-                diff = (target_value - current_value) / target_value
-                if diff > 0.2:
-                    recommendations[
-                        metric] = f"Povečaj skupno obremenitev vadbe za {diff * 100:.1f}% z daljšim trajanjem ali večjo intenzivnostjo"
-
-            elif metric == 'MET':
-                diff = target_value - current_value
-                if diff > 0.5:
-                    recommendations[metric] = f"Izberi bolj intenzivne aktivnosti za povečanje MET ocene za {diff:.1f}"
-
-            elif metric == 'WEI':
-                diff = target_value - current_value
-                if diff > 0.2:
-                    recommendations[metric] = "Povečaj učinkovitost vadbe z izboljšanjem tehnike ali dodajanjem upora"
-                elif diff < -0.2:
-                    recommendations[metric] = "Tvoj WEI je nenavadno visok – preveri, ali se ne pretreniraš"
-
-        # General recommendations based on percentile
-        percentile = self.predict_percentile(new_workout)
-        if percentile < 50:
-            recommendations[
-                'general'] = "Osredotoči se najprej na doslednost – ciljaj na redno vadbo, preden povečaš intenzivnost"
-        elif percentile < 75:
-            recommendations['general'] = "Poskusi vključiti intervalni trening za izboljšanje kakovosti vadbe"
-        else:
-            recommendations['general'] = "Ohrani odlično vadbeno rutino z ustreznim okrevanjem"
-
-        return recommendations
+        return self.evaluate([new_workout])[1][0]
 
     def save(self, filepath):
         """
@@ -184,27 +361,206 @@ class WorkoutPercentileModel:
         save_dict = {
             'features': self.features,
             'top_metrics': self.top_metrics,
-            'scaler': self.scaler
+            'scaler': self.scaler,
+            'composite_mean': self.composite_mean,
+            'composite_scale': self.composite_scale,
+            'sorted_scores': self.sorted_scores,
+            'reference_sketch': self.reference_sketch.to_arrays()
         }
         joblib.dump(save_dict, f"{filepath}_attrs.pkl")
 
+        # Save a TensorFlow-free copy of the network for serving
+        export_numpy_model(filepath, keras_model=self.model, attrs=save_dict)
+
+
+def update_reference_statistics(model_base_path, workouts):
+    """
+    Fold new workouts into the percentile reference of a trained model without retraining it.
+
+    The new workouts are added to the model's ReferenceSketch, whose running mean and variance
+    define the composite scaler; the sorted composite scores and the top 10% medians
+    (top_metrics) are then recomputed from the sketch. The network and its input scaler stay
+    as they were trained. Both <base>_attrs.pkl and <base>_numpy.npz are replaced atomically,
+    so ModelRegistry picks the update up on its next lookup.
+
+    Append the workouts to the analysis CSV as well if the next retraining should include them.
+
+    Args:
+        model_base_path (str): Base path of the model files (without extensions)
+        workouts: New workouts, as a list of dicts, 2-D array or DataFrame (see workouts_to_matrix),
+            or a ReferenceSketch built from them
+
+    Returns:
+        dict: Number of workouts added and skipped, size of the reference and the new top_metrics
+    """
+    attrs_path = f"{model_base_path}_attrs.pkl"
+    npz_path = numpy_model_path(model_base_path)
+    attrs = joblib.load(attrs_path) if os.path.exists(attrs_path) else None
+
+    if os.path.exists(npz_path):
+        with np.load(npz_path, allow_pickle=False) as data:
+            features = [str(feat) for feat in data['features']]
+            sketch = ReferenceSketch.from_arrays(data) if 'sketch_rows' in data.files else None
+    elif attrs is not None:
+        features = attrs['features']
+        sketch = ReferenceSketch.from_arrays(attrs['reference_sketch']) if 'reference_sketch' in attrs else None
+    else:
+        raise FileNotFoundError(f"No model artifacts found at {model_base_path}")
+    if sketch is None:
+        raise ValueError(f"{model_base_path} has no stored reference sketch, retrain it first")
+
+    if isinstance(workouts, ReferenceSketch):
+        added, skipped = workouts.count, 0
+        sketch.merge(workouts)
+    else:
+        # Workouts with missing metrics ('N/A' in the FIT summary) cannot be ranked
+        new_data = workouts_to_matrix(workouts, features, allow_missing=True)
+        finite = np.isfinite(new_data).all(axis=1)
+        added, skipped = int(finite.sum()), int((~finite).sum())
+        sketch.update(new_data[finite])
+
+    reference = sketch.statistics(features)
+    updates = {
+        'composite_mean': reference['composite_mean'],
+        'composite_scale': reference['composite_scale'],
+        'sorted_scores': reference['sorted_scores'],
+    }
+
+    if attrs is not None:
+        attrs.update(updates, top_metrics=reference['top_metrics'], reference_sketch=sketch.to_arrays())
+        temp_path = f"{attrs_path}.{os.getpid()}.tmp"
+        joblib.dump(attrs, temp_path)
+        os.replace(temp_path, attrs_path)
+    if os.path.exists(npz_path):
+        update_numpy_model(model_base_path,
+                           top_metric_values=np.array([reference['top_metrics'][feat] for feat in features]),
+                           **updates, **sketch.to_arrays())
+
+    return {
+        'added': added,
+        'skipped': skipped,
+        'reference_size': sketch.count,
+        'top_metrics': reference['top_metrics'],
+    }
+
+
+# Environment variables that cap the thread pools of BLAS libraries and TensorFlow
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS']
+
+DEFAULT_HYPERPARAMETERS = {'epochs': 100, 'batch_size': 32}
+
+
+def manifest_path(model_base_path):
+    return f"{model_base_path}_manifest.json"
+
+
+def _is_up_to_date(model_base_path, data_hash, hyperparameters):
+    """True when the artifacts were trained from the same data with the same hyperparameters"""
+    artifacts = [f"{model_base_path}.h5", f"{model_base_path}_attrs.pkl", numpy_model_path(model_base_path)]
+    if not all(os.path.exists(path) for path in artifacts):
+        return False
+    try:
+        with open(manifest_path(model_base_path), encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return manifest.get('data_sha256') == data_hash and manifest.get('hyperparameters') == hyperparameters
+
+
+@contextlib.contextmanager
+def _thread_capped_environment(threads):
+    # Spawned workers inherit os.environ, so BLAS reads the cap before it initialises
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    os.environ.update({name: str(threads) for name in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _init_training_worker(threads):
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+
+def _train_workout_type(file_path, model_base_path, hyperparameters, data_hash, source_path):
+    """
+    Train, save and smoke-test one workout type; runs in a training worker process.
+
+    file_path is the CSV or its feature matrix; data_hash is the sha256 of the CSV, source_path.
+    """
+    base_name = os.path.basename(model_base_path)
+    started = time.time()
+
+    # Create and train model
+    model = WorkoutPercentileModel(file_path, **hyperparameters)
+
+    # Save the model components, then record what they were trained from
+    model.save(model_base_path)
+    with open(manifest_path(model_base_path), "w", encoding="utf-8") as file:
+        json.dump({'data_path': os.path.basename(source_path),
+                   'data_sha256': data_hash,
+                   'trained_from': os.path.basename(file_path),
+                   'hyperparameters': hyperparameters,
+                   'trained_at': time.strftime("%Y-%m-%dT%H:%M:%S")}, file, indent=2)
+
+    lines = [f"Successfully saved {base_name}.h5 and {base_name}_attrs.pkl ({time.time() - started:.1f}s)"]
+
+    # Test with a sample workout
+    test_workout = {
+        'HRmax': 160,
+        'HR%': 75,
+        'TLI': 7000,
+        'MET': 6.5,
+        'WEI': 1.1
+    }
+    percentiles, recommendations = model.evaluate([test_workout])
+    lines.append(f"  Test workout percentile: {percentiles[0]}")
+
+    # Show some recommendations
+    lines.append("  Sample recommendations:")
+    for metric, rec in list(recommendations[0].items())[:2]:  # Show first 2 recommendations
+        lines.append(f"  - {metric}: {rec}")
+    return "\n".join(lines)
+
 
 def create_and_save_models(data_dir="sorted_and_calculated_data",
                            model_dir="models",
-                           file_pattern="*_analysis.csv"):
+                           file_pattern="*_analysis.csv",
+                           workers=None,
+                           threads_per_worker=1,
+                           hyperparameters=None,
+                           force=False):
     """
     Process all analysis files in a directory and save trained models
 
+    Workout types are trained in parallel worker processes, from the <type>_features.npy
+    matrix next to a CSV when the partitioner wrote one. A type is skipped when the content
+    hash of its data and its hyperparameters match the manifest saved next to its artifacts.
+
     Args:
         data_dir (str): Directory containing the CSV files
         model_dir (str): Directory to save trained models
         file_pattern (str): Pattern to match analysis files
+        workers (int): Number of training processes (one per workout type, up to the CPU count, if None)
+        threads_per_worker (int): TensorFlow and BLAS threads per training process
+        hyperparameters (dict): Training hyperparameters, see DEFAULT_HYPERPARAMETERS; a 'chunksize'
+            entry streams the CSVs instead of loading them
+        force (bool): Retrain even when the artifacts are up to date
     """
+    hyperparameters = dict(DEFAULT_HYPERPARAMETERS, **(hyperparameters or {}))
+
     # Create models directory if it doesn't exist
     os.makedirs(model_dir, exist_ok=True)
 
     # Find all analysis files
-    analysis_files = glob.glob(os.path.join(data_dir, file_pattern))
+    analysis_files = sorted(glob.glob(os.path.join(data_dir, file_pattern)))
 
     if not analysis_files:
         print(f"No files matching {file_pattern} found in {data_dir}")
@@ -212,50 +568,65 @@ def create_and_save_models(data_dir="sorted_and_calculated_data",
 
     print(f"Found {len(analysis_files)} analysis files to process...")
 
+    jobs = []
     for file_path in analysis_files:
         # Extract base name (e.g., "Running" from "Running_analysis.csv")
         base_name = os.path.basename(file_path).split('_')[0]
         model_base_path = os.path.join(model_dir, base_name)
 
-        print(f"\nProcessing {base_name}...")
-
-        try:
-            # Create and train model
-            model = WorkoutPercentileModel(file_path)
-
-            # Save the model components
-            model.save(model_base_path)
-            print(f"Successfully saved {base_name}.h5 and {base_name}_attrs.pkl")
-
-            # Test with a sample workout
-            test_workout = {
-                'HRmax': 160,
-                'HR%': 75,
-                'TLI': 7000,
-                'MET': 6.5,
-                'WEI': 1.1
-            }
-            percentile = model.predict_percentile(test_workout)
-            print(f"  Test workout percentile: {percentile}")
+        # The CSV is the training data; the manifest records its hash even when training
+        # reads the partitioner's feature matrix instead
+        data_hash = file_sha256(file_path)
+
+        if not force and _is_up_to_date(model_base_path, data_hash, hyperparameters):
+            print(f"Skipping {base_name}, data and hyperparameters are unchanged")
+            continue
+
+        # Train from the feature matrix only when it was written from this very CSV
+        train_path = file_path
+        matrix_path = feature_matrix_path(file_path)
+        if os.path.exists(matrix_path):
+            try:
+                load_feature_matrix(matrix_path, source_sha256=data_hash)
+                train_path = matrix_path
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Training {base_name} from the CSV, its feature matrix is unusable: {e}")
+        jobs.append((train_path, model_base_path, hyperparameters, data_hash, file_path))
+
+    if not jobs:
+        print("\nAll models are up to date!")
+        return
 
-            # Show some recommendations
-            recs = model.get_improvement_recommendations(test_workout)
-            print("  Sample recommendations:")
-            for metric, rec in list(recs.items())[:2]:  # Show first 2 recommendations
-                print(f"  - {metric}: {rec}")
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    started = time.time()
+    print(f"Training {len(jobs)} models in {workers} processes...")
 
-        except Exception as e:
-            print(f"Error processing {file_path}: {str(e)}")
+    with _thread_capped_environment(threads_per_worker), \
+            ProcessPoolExecutor(max_workers=workers,
+                                mp_context=multiprocessing.get_context("spawn"),
+                                initializer=_init_training_worker,
+                                initargs=(threads_per_worker,)) as executor:
+        futures = {executor.submit(_train_workout_type, *job): job for job in jobs}
+        for future in as_completed(futures):
+            file_path, model_base_path = futures[future][:2]
+            print(f"\nProcessed {os.path.basename(model_base_path)}...")
+            try:
+                print(future.result())
+            except Exception as e:
+                print(f"Error processing {file_path}: {str(e)}")
 
-    print("\nAll models processed!")
+    print(f"\nAll models processed in {time.time() - started:.1f}s!")
 
 
-def load_workout_model(model_base_path):
+def load_workout_model(model_base_path, engine="auto"):
     """
     Load a saved workout model from .h5 and .pkl files
 
     Args:
         model_base_path (str): Base path of the model files (without extensions)
+        engine (str): "numpy" to serve from <base>_numpy.npz without TensorFlow,
+            "keras" to load the .h5 model, "auto" to prefer numpy when exported,
+            "empirical" to rank against the training composite scores without a network
 
     Returns:
         A reconstructed WorkoutPercentileModel-like object (simplified version)
@@ -267,82 +638,64 @@ def load_workout_model(model_base_path):
             pass
 
     loaded_model = LoadedWorkoutModel()
+    loaded_model.workout_type = os.path.basename(model_base_path)
+
+    if engine == "auto":
+        engine = "numpy" if os.path.exists(numpy_model_path(model_base_path)) else "keras"
+    loaded_model.engine = engine
+
+    if engine == "numpy":
+        # The scaler is folded into the network, so only NumPy is needed
+        loaded_model.model, loaded_model.features, loaded_model.top_metrics = load_numpy_model(model_base_path)
+    elif engine == "empirical":
+        # Exact O(log n) percentile lookup, also usable when the network cannot be loaded
+        loaded_model.model, loaded_model.features, loaded_model.top_metrics = load_empirical_model(model_base_path)
+    else:
+        # Load Keras model
+        import tensorflow as tf
+        loaded_model.model = tf.keras.models.load_model(f"{model_base_path}.h5", compile=False)
+
+        # Load attributes
+        attrs = joblib.load(f"{model_base_path}_attrs.pkl")
+        for key, value in attrs.items():
+            setattr(loaded_model, key, value)
+
+    # Add the predict_percentiles method
+    def predict_percentiles(self, workouts):
+        input_data = workouts_to_matrix(workouts, self.features)
+        if len(input_data) == 0:
+            return np.empty(0)
+
+        # Predict (output is 0-1, so we multiply by 100 to get percentile)
+        with timed("predict", self.workout_type):
+            if self.engine in ("numpy", "empirical"):
+                percentiles = self.model.predict(input_data)[:, 0] * 100
+            else:
+                scaled_input = self.scaler.transform(input_data)
+                percentiles = self.model.predict(scaled_input, batch_size=len(scaled_input), verbose=0)[:, 0] * 100
 
-    # Load Keras model
-    loaded_model.model = tf.keras.models.load_model(f"{model_base_path}.h5")
+        return np.round(percentiles.astype(np.float64), 2)
 
-    # Load attributes
-    attrs = joblib.load(f"{model_base_path}_attrs.pkl")
-    for key, value in attrs.items():
-        setattr(loaded_model, key, value)
+    loaded_model.predict_percentiles = predict_percentiles.__get__(loaded_model)
 
     # Add the predict_percentile method
     def predict_percentile(self, new_workout):
-        # Convert input to numpy array
-        if isinstance(new_workout, dict):
-            input_data = np.array([new_workout[feat] for feat in self.features]).reshape(1, -1)
-        else:
-            input_data = np.array(new_workout).reshape(1, -1)
-
-        # Scale the input
-        scaled_input = self.scaler.transform(input_data)
+        return float(self.predict_percentiles([new_workout] if isinstance(new_workout, dict) else new_workout)[0])
 
-        # Predict (output is 0-1, so we multiply by 100 to get percentile)
-        percentile = self.model.predict(scaled_input, verbose=0)[0][0] * 100
+    loaded_model.predict_percentile = predict_percentile.__get__(loaded_model)
 
-        return round(percentile, 2)
+    # Add the evaluate method
+    def evaluate(self, workouts):
+        input_data = workouts_to_matrix(workouts, self.features)
+        percentiles = self.predict_percentiles(input_data)
+        with timed("recommendations", self.workout_type):
+            return percentiles, recommend(input_data, percentiles, self.features, self.top_metrics)
 
-    loaded_model.predict_percentile = predict_percentile.__get__(loaded_model)
+    loaded_model.evaluate = evaluate.__get__(loaded_model)
 
     # Add the get_improvement_recommendations method
     def get_improvement_recommendations(self, new_workout):
-        recommendations = {}
-        for metric in self.features:
-            current_value = new_workout[metric]
-            target_value = self.top_metrics[metric]
-
-            if metric == 'HRmax':
-                diff = target_value - current_value
-                if diff > 5:
-                    recommendations[
-                        metric] = f"Povečaj največji srčni utrip za {diff:.1f} utripov/min z intenzivnejšimi intervali"
-                elif diff < -5:
-                    recommendations[metric] = "Tvoj HRmax je nenavadno visok – razmisli o posvetu z zdravnikom"
-
-            elif metric == 'HR%':
-                diff = target_value - current_value
-                if diff > 5:
-                    recommendations[
-                        metric] = f"Preživi več časa v višjih območjih srčnega utripa (ciljaj na {target_value:.1f}% maksimalnega)"
-
-            elif metric == 'TLI':
-                diff = (target_value - current_value) / target_value
-                if diff > 0.2:
-                    recommendations[
-                        metric] = f"Povečaj skupno obremenitev vadbe za {diff * 100:.1f}% z daljšim trajanjem ali večjo intenzivnostjo"
-
-            elif metric == 'MET':
-                diff = target_value - current_value
-                if diff > 0.5:
-                    recommendations[metric] = f"Izberi bolj intenzivne aktivnosti za povečanje MET ocene za {diff:.1f}"
-
-            elif metric == 'WEI':
-                diff = target_value - current_value
-                if diff > 0.2:
-                    recommendations[metric] = "Povečaj učinkovitost vadbe z izboljšanjem tehnike ali dodajanjem upora"
-                elif diff < -0.2:
-                    recommendations[metric] = "Tvoj WEI je nenavadno visok – preveri, ali se ne pretreniraš"
-
-        percentile = self.predict_percentile(new_workout)
-        if percentile < 50:
-            recommendations[
-                'general'] = "Najprej se osredotoči na doslednost – ciljaj na redne vadbe, preden povečaš intenzivnost"
-        elif percentile < 75:
-            recommendations['general'] = "Poskusi vključiti intervalni trening za izboljšanje kakovosti vadbe"
-        else:
-            recommendations['general'] = "Ohrani svojo odlično vadbeno rutino z ustreznim počitkom"
-
-        return recommendations
+        return self.evaluate([new_workout])[1][0]
 
     loaded_model.get_improvement_recommendations = get_improvement_recommendations.__get__(loaded_model)
 
@@ -350,4 +703,24 @@ def load_workout_model(model_base_path):
 
 
 if __name__ == "__main__":
-    create_and_save_models()
+    parser = argparse.ArgumentParser(description="Train one percentile model per workout type")
+    parser.add_argument("--data-dir", default="sorted_and_calculated_data")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--workers", type=int, default=None, help="Training processes (default: one per type)")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--epochs", type=int, default=DEFAULT_HYPERPARAMETERS['epochs'])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_HYPERPARAMETERS['batch_size'])
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream each CSV in chunks of this many rows (for data larger than memory)")
+    parser.add_argument("--force", action="store_true", help="Retrain even if nothing changed")
+    args = parser.parse_args()
+
+    hyperparameters = {'epochs': args.epochs, 'batch_size': args.batch_size}
+    if args.chunksize:
+        hyperparameters['chunksize'] = args.chunksize
+
+    create_and_save_models(args.data_dir, args.model_dir,
+                           workers=args.workers,
+                           threads_per_worker=args.threads_per_worker,
+                           hyperparameters=hyperparameters,
+                           force=args.force)
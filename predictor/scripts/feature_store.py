@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+
+FEATURES = ['HRmax', 'HR%', 'TLI', 'MET', 'WEI']
+FEATURE_DTYPE = np.float32
+
+
+def _to_float(value):
+    # parse_fit_file writes "N/A" for fields missing from the FIT file
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def to_float_array(values, dtype=FEATURE_DTYPE):
+    """
+    Convert a column (or a scalar) to a float array, with 'N/A' and other non-numbers as NaN.
+
+    Args:
+        values: Scalar, list, np.ndarray or pandas Series
+        dtype: Float dtype of the result
+
+    Returns:
+        np.ndarray: 1-D array (no copy if values already have that dtype)
+    """
+    if isinstance(values, (str, int, float)):
+        return np.array([_to_float(values)], dtype=dtype)
+    values = np.atleast_1d(np.asarray(values))
+    if values.dtype.kind in 'biuf':
+        return values.astype(dtype, copy=False)
+    return np.array([_to_float(value) for value in values.ravel()], dtype=dtype)
+
+
+def feature_values(features):
+    """
+    Python floats of a row of float32 features, for storing and serialising them.
+
+    Each value is the shortest decimal that rounds to the same float32 (6605.181 rather
+    than 6605.18115234375), so float32 rounding noise does not leak into history rows
+    and API responses.
+
+    Args:
+        features (np.ndarray): 1-D float array
+
+    Returns:
+        list: Python floats (NaN where the feature is missing)
+    """
+    return [float(np.format_float_positional(value, unique=True, trim='0'))
+            for value in np.asarray(features, dtype=FEATURE_DTYPE)]
+
+
+def workout_features(age, heart_rate, duration, resting_heart_rate, distance, dtype=FEATURE_DTYPE, out=None):
+    """
+    Compute the model features HRmax, HR%, TLI, MET and WEI of a batch of workouts.
+
+    Each argument is a column (or a scalar) of the raw workout data; 'N/A' placeholders
+    give NaN features. The features are computed into the columns of one array, without
+    temporaries.
+
+    Args:
+        age: Age in years
+        heart_rate: Average heart rate (bpm)
+        duration: Workout duration (mins)
+        resting_heart_rate: Resting heart rate (bpm)
+        distance: Distance (km)
+        dtype: Float dtype of the features (float64 keeps the analysis CSVs exact)
+        out (np.ndarray): Array of shape (n, 5) to write into, ideally Fortran-ordered
+
+    Returns:
+        np.ndarray: Array of shape (n, 5) with the columns in FEATURES order
+    """
+    columns = [to_float_array(column, dtype) for column in (age, heart_rate, duration, resting_heart_rate, distance)]
+    rows = max(len(column) for column in columns)
+    age, heart_rate, duration, resting_heart_rate, distance = columns
+    if out is None:
+        out = np.empty((rows, len(FEATURES)), dtype=dtype, order='F')
+    hr_max, hr_percent, tli, met, wei = out.T
+
+    # Scalars broadcast against columns; divisions by zero give inf/NaN like pandas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.multiply(age, -0.7, out=hr_max)
+        hr_max += 208
+        np.divide(heart_rate, hr_max, out=hr_percent)
+        hr_percent *= 100
+        np.multiply(heart_rate, duration, out=tli)
+        np.divide(heart_rate, resting_heart_rate, out=met)
+        met *= 3.5
+        np.multiply(hr_percent, distance, out=wei)
+        wei /= duration
+    return out
+
+
+def feature_matrix_path(csv_path):
+    """Path of the feature matrix stored next to an analysis CSV: <type>_features.npy"""
+    base = os.path.splitext(csv_path)[0]
+    if base.endswith("_analysis"):
+        base = base[:-len("_analysis")]
+    return f"{base}_features.npy"
+
+
+def schema_path(matrix_path):
+    return f"{os.path.splitext(matrix_path)[0]}.json"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureMatrixWriter:
+    def __init__(self, matrix_path, features=FEATURES, dtype=FEATURE_DTYPE):
+        """
+        Append-only writer of a feature matrix (.npy) and its schema sidecar (.json).
+
+        Rows are streamed to a raw temporary file, since the row count is only known at
+        the end; close() turns it into a .npy without holding the matrix in memory.
+
+        Args:
+            matrix_path (str): Path of the .npy file to write
+            features (list): Column names, in order
+            dtype: Stored dtype of the matrix
+        """
+        self.matrix_path = matrix_path
+        self.features = list(features)
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._raw_path = f"{matrix_path}.raw.tmp"
+        self._raw = open(self._raw_path, "wb")
+
+    def append(self, rows):
+        """
+        Append rows given in the column order of features.
+
+        Args:
+            rows (np.ndarray): Array of shape (n, len(features))
+        """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        self._raw.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self, source=None, source_sha256=None, block_rows=1 << 16):
+        """
+        Write the .npy and the schema, replacing earlier versions.
+
+        Args:
+            source (str): Name of the file the rows came from, recorded in the schema
+            source_sha256 (str): sha256 of that file, recorded in the schema so a matrix
+                left behind by an older version of the file can be told apart
+            block_rows (int): Rows copied at a time
+        """
+        self._raw.close()
+        shape = (self.rows, len(self.features))
+        temp_path = f"{self.matrix_path}.tmp"
+        matrix = np.lib.format.open_memmap(temp_path, mode="w+", dtype=self.dtype, shape=shape)
+        if self.rows:
+            raw = np.memmap(self._raw_path, dtype=self.dtype, mode="r", shape=shape)
+            for start in range(0, self.rows, block_rows):
+                matrix[start:start + block_rows] = raw[start:start + block_rows]
+            del raw
+        matrix.flush()
+        del matrix
+        os.replace(temp_path, self.matrix_path)
+        os.remove(self._raw_path)
+
+        schema = {'columns': self.features, 'dtype': self.dtype.name, 'rows': self.rows, 'source': source,
+                  'source_sha256': source_sha256}
+        with open(schema_path(self.matrix_path), "w", encoding="utf-8") as file:
+            json.dump(schema, file, indent=2)
+
+    def discard(self):
+        """Drop everything written so far"""
+        self._raw.close()
+        os.remove(self._raw_path)
+
+
+def load_feature_matrix(matrix_path, features=FEATURES, mmap=True, source_sha256=None):
+    """
+    Load feature columns from a matrix written by FeatureMatrixWriter.
+
+    Args:
+        matrix_path (str): Path of the .npy file
+        features (list): Columns to return, in this order
+        mmap (bool): Memory-map the file instead of reading it
+        source_sha256 (str): Expected sha256 of the source CSV; a matrix written from
+            other contents (or without a recorded hash) is rejected with ValueError
+
+    Returns:
+        np.ndarray: Array of shape (rows, len(features)) in the stored dtype (a read-only
+            memory map when the stored columns are exactly the requested ones)
+    """
+    with open(schema_path(matrix_path), encoding="utf-8") as file:
+        schema = json.load(file)
+    if source_sha256 is not None and schema.get('source_sha256') != source_sha256:
+        raise ValueError(f"{matrix_path} was not written from the current {schema.get('source') or 'source'}")
+    matrix = np.load(matrix_path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    if matrix.shape != (schema['rows'], len(schema['columns'])):
+        raise ValueError(f"{matrix_path} has shape {matrix.shape}, its schema describes "
+                         f"{schema['rows']} rows of {schema['columns']}")
+
+    missing = [feat for feat in features if feat not in schema['columns']]
+    if missing:
+        raise KeyError(f"{matrix_path} has no columns {missing}")
+    if list(features) == schema['columns']:
+        return matrix
+    return matrix[:, [schema['columns'].index(feat) for feat in features]]
+
+
+def convert_csv(csv_path, features=FEATURES, chunksize=100000):
+    """
+    Write the feature matrix of an existing analysis CSV.
+
+    Args:
+        csv_path (str): Path of the *_analysis.csv file
+        features (list): Feature columns to store
+        chunksize (int): Rows read at a time
+
+    Returns:
+        str: Path of the written .npy file
+    """
+    import pandas as pd
+    csv_hash = file_sha256(csv_path)
+    writer = FeatureMatrixWriter(feature_matrix_path(csv_path), features)
+    try:
+        for chunk in pd.read_csv(csv_path, usecols=features, chunksize=chunksize):
+            writer.append(chunk[features].to_numpy())
+    except Exception:
+        writer.discard()
+        raise
+    writer.close(source=os.path.basename(csv_path), source_sha256=csv_hash)
+    return writer.matrix_path
+
+
+if __name__ == "__main__":
+    # Build the feature matrices of existing analysis CSVs: python feature_store.py sorted_and_calculated_data
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "sorted_and_calculated_data"
+    for file_name in sorted(os.listdir(data_dir)):
+        if file_name.endswith("_analysis.csv"):
+            print(f"Wrote {convert_csv(os.path.join(data_dir, file_name))}")
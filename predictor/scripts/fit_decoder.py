@@ -0,0 +1,340 @@
+import struct
+import sys
+import time
+import numpy as np
+
+# Seconds between the Unix epoch and the FIT epoch (1989-12-31 00:00:00 UTC)
+FIT_EPOCH = 631065600
+
+MESSAGE_NUMBERS = {'file_id': 0, 'user_profile': 3, 'session': 18, 'record': 20, 'activity': 34}
+FIELD_DESCRIPTION = 206
+
+# Profile fields the decoder can project: name -> (field number, scale, offset)
+PROFILE_FIELDS = {
+    'record': {
+        'timestamp': (253, 1, 0),
+        'altitude': (2, 5, 500),
+        'heart_rate': (3, 1, 0),
+        'cadence': (4, 1, 0),
+        'distance': (5, 100, 0),
+        'speed': (6, 1000, 0),
+        'power': (7, 1, 0),
+    },
+    'session': {
+        'timestamp': (253, 1, 0),
+        'start_time': (2, 1, 0),
+        'total_elapsed_time': (7, 1000, 0),
+        'total_timer_time': (8, 1000, 0),
+        'total_distance': (9, 100, 0),
+        'total_calories': (11, 1, 0),
+        'avg_heart_rate': (16, 1, 0),
+        'max_heart_rate': (17, 1, 0),
+    },
+    'user_profile': {
+        'gender': (1, 1, 0),
+        'age': (2, 1, 0),
+        'height': (3, 100, 0),
+        'weight': (4, 10, 0),
+    },
+}
+
+# Fields decoded when the caller does not ask for specific ones
+DEFAULT_FIELDS = {
+    'record': ['timestamp', 'heart_rate', 'distance', 'steps'],
+    'session': ['total_calories', 'start_time'],
+    'user_profile': ['gender', 'age', 'height', 'weight'],
+}
+
+# FIT base type number -> (NumPy type code, invalid value); strings are not projected
+BASE_TYPES = {
+    0: ('u1', 0xFF),  # enum
+    1: ('i1', 0x7F),
+    2: ('u1', 0xFF),
+    3: ('i2', 0x7FFF),
+    4: ('u2', 0xFFFF),
+    5: ('i4', 0x7FFFFFFF),
+    6: ('u4', 0xFFFFFFFF),
+    8: ('f4', None),
+    9: ('f8', None),
+    10: ('u1', 0),  # uint8z
+    11: ('u2', 0),  # uint16z
+    12: ('u4', 0),  # uint32z
+    13: ('u1', 0xFF),  # byte
+    14: ('i8', 0x7FFFFFFFFFFFFFFF),
+    15: ('u8', 0xFFFFFFFFFFFFFFFF),
+    16: ('u8', 0),  # uint64z
+}
+
+
+class FitDecodeError(ValueError):
+    pass
+
+
+class _Definition:
+    def __init__(self, global_number, endian, fields, dev_fields, size):
+        self.global_number = global_number
+        self.endian = endian
+        # field number -> (offset in message, size, base type)
+        self.fields = fields
+        # (developer data index, field number) -> (offset in message, size)
+        self.dev_fields = dev_fields
+        self.size = size
+        # Byte positions of the data messages that use this definition
+        self.starts = []
+        # Index in starts -> timestamp, for messages with a compressed timestamp header
+        self.compressed_timestamps = {}
+
+
+def _read_source(fit_source):
+    if hasattr(fit_source, 'read'):
+        return fit_source.read()
+    if isinstance(fit_source, (bytes, bytearray, memoryview)):
+        return bytes(fit_source)
+    with open(fit_source, 'rb') as file:
+        return file.read()
+
+
+def _gather(data, starts, offset, size, type_code, endian):
+    """Pull one field out of every message in starts with a single fancy-indexing pass"""
+    dtype = np.dtype(type_code).newbyteorder(endian)
+    if size < dtype.itemsize:
+        return None
+    positions = np.asarray(starts, dtype=np.int64) + (1 + offset)
+    raw = data[positions[:, None] + np.arange(dtype.itemsize)]
+    # Arrays keep only their first element, like a scalar read of the field
+    return np.ascontiguousarray(raw).view(dtype)[:, 0]
+
+
+def _to_float(values, invalid, scale, offset):
+    result = values.astype(np.float64)
+    if invalid is not None:
+        result[values == invalid] = np.nan
+    if scale != 1 or offset != 0:
+        result = result / scale - offset
+    return result
+
+
+def _walk(data):
+    """
+    Walk all FIT records once, collecting message positions per definition.
+
+    Returns:
+        tuple: (list of _Definition, developer field descriptions)
+    """
+    definitions = []
+    dev_descriptions = {}
+    position = 0
+    end_of_file = len(data)
+
+    while position < end_of_file:
+        if end_of_file - position < 12:
+            raise FitDecodeError("Truncated FIT header")
+        header_size = data[position]
+        data_size = struct.unpack_from('<I', data, position + 4)[0]
+        if data[position + 8:position + 12] != b'.FIT':
+            raise FitDecodeError("Not a FIT file")
+        position += header_size
+        end_of_data = position + data_size
+        if end_of_data > end_of_file:
+            raise FitDecodeError("Truncated FIT data")
+
+        local = {}
+        last_timestamp_position = None
+        last_timestamp_format = None
+        last_timestamp = None
+
+        while position < end_of_data:
+            header = data[position]
+
+            if header & 0x80:
+                # Compressed timestamp header: 2-bit local type, 5-bit time offset
+                definition = local.get((header >> 5) & 0x03)
+                if definition is None:
+                    raise FitDecodeError(f"Data message without definition at byte {position}")
+                if last_timestamp_position is not None:
+                    last_timestamp = struct.unpack_from(last_timestamp_format, data, last_timestamp_position)[0]
+                    last_timestamp_position = None
+                if last_timestamp is not None:
+                    time_offset = header & 0x1F
+                    last_timestamp += (time_offset - last_timestamp) & 0x1F
+                    definition.compressed_timestamps[len(definition.starts)] = last_timestamp
+                definition.starts.append(position)
+                position += 1 + definition.size
+
+            elif header & 0x40:
+                # Definition message
+                endian = '>' if data[position + 2] else '<'
+                global_number, field_count = struct.unpack_from(endian + 'HB', data, position + 3)
+                fields = {}
+                offset = 0
+                cursor = position + 6
+                for _ in range(field_count):
+                    number, size, base_type = data[cursor], data[cursor + 1], data[cursor + 2]
+                    fields[number] = (offset, size, base_type & 0x1F)
+                    offset += size
+                    cursor += 3
+                dev_fields = {}
+                if header & 0x20:
+                    dev_count = data[cursor]
+                    cursor += 1
+                    for _ in range(dev_count):
+                        number, size, dev_index = data[cursor], data[cursor + 1], data[cursor + 2]
+                        dev_fields[(dev_index, number)] = (offset, size)
+                        offset += size
+                        cursor += 3
+                definition = _Definition(global_number, endian, fields, dev_fields, offset)
+                definitions.append(definition)
+                local[header & 0x0F] = definition
+                position = cursor
+
+            else:
+                # Data message with a normal header
+                definition = local.get(header & 0x0F)
+                if definition is None:
+                    raise FitDecodeError(f"Data message without definition at byte {position}")
+                timestamp_field = definition.fields.get(253)
+                if timestamp_field is not None:
+                    last_timestamp_position = position + 1 + timestamp_field[0]
+                    last_timestamp_format = definition.endian + 'I'
+                if definition.global_number == FIELD_DESCRIPTION:
+                    _read_field_description(data, position, definition, dev_descriptions)
+                definition.starts.append(position)
+                position += 1 + definition.size
+
+        if position > end_of_data:
+            raise FitDecodeError("Truncated FIT record")
+
+        # Skip the file CRC; a chained FIT file may follow
+        position = end_of_data + 2
+
+    return definitions, dev_descriptions
+
+
+def _read_field_description(data, position, definition, dev_descriptions):
+    """Decode a field_description message so developer fields can be projected by name"""
+    values = {}
+    for number in (0, 1, 2, 3, 6, 7):
+        if number not in definition.fields:
+            continue
+        offset, size, base_type = definition.fields[number]
+        raw = data[position + 1 + offset:position + 1 + offset + size]
+        if number == 3:
+            values[number] = raw.split(b'\0', 1)[0].decode('utf-8', errors='replace')
+        elif number == 7:
+            values[number] = struct.unpack('b', raw[:1])[0]
+        else:
+            values[number] = raw[0]
+    if 0 in values and 1 in values and 3 in values:
+        scale = values.get(6, 0xFF)
+        offset = values.get(7, 0x7F)
+        dev_descriptions[(values[0], values[1])] = (
+            values[3],
+            values.get(2, 13) & 0x1F,
+            1 if scale in (0, 0xFF) else scale,
+            0 if offset == 0x7F else offset)
+
+
+def _field_columns(data, definition, name, spec, dev_by_name):
+    """Return (values, invalid) of one field for every message of a definition, or None"""
+    if spec is not None and spec[0] in definition.fields:
+        offset, size, base_type = definition.fields[spec[0]]
+        scale, value_offset = spec[1], spec[2]
+    elif name in dev_by_name:
+        key, base_type, scale, value_offset = dev_by_name[name]
+        if key not in definition.dev_fields:
+            return None
+        offset, size = definition.dev_fields[key]
+    else:
+        return None
+    if base_type not in BASE_TYPES:
+        return None
+    type_code, invalid = BASE_TYPES[base_type]
+    values = _gather(data, definition.starts, offset, size, type_code, definition.endian)
+    if values is None:
+        return None
+    return _to_float(values, invalid, scale, value_offset)
+
+
+def decode_fit(fit_source, fields=None):
+    """
+    Decode a FIT file in one pass, projecting only the requested fields.
+
+    Args:
+        fit_source: Path to a .fit file, its bytes or a binary file-like object
+        fields (dict): Message name ('record', 'session', 'user_profile') -> list of field
+            names to decode. Developer fields can be requested by their field_name.
+            Defaults to DEFAULT_FIELDS.
+
+    Returns:
+        dict: {'record': {field: np.ndarray}, 'session': {field: value}, 'user_profile': {field: value}}
+            Record fields are float64 arrays in file order with NaN where a value is missing,
+            timestamps are Unix seconds. Session and user_profile fields hold the last valid
+            value in the file, or None.
+    """
+    fields = DEFAULT_FIELDS if fields is None else fields
+    raw = _read_source(fit_source)
+    try:
+        definitions, dev_descriptions = _walk(raw)
+    except (IndexError, struct.error) as e:
+        raise FitDecodeError("Truncated or corrupt FIT file") from e
+    data = np.frombuffer(raw, dtype=np.uint8)
+    dev_by_name = {name: (key, base_type, scale, offset)
+                   for key, (name, base_type, scale, offset) in dev_descriptions.items()}
+
+    result = {}
+    for message_name, field_names in fields.items():
+        message_number = MESSAGE_NUMBERS[message_name]
+        profile = PROFILE_FIELDS.get(message_name, {})
+        message_definitions = [d for d in definitions if d.global_number == message_number and d.starts]
+        starts = np.concatenate([np.asarray(d.starts, dtype=np.int64) for d in message_definitions]) \
+            if message_definitions else np.empty(0, dtype=np.int64)
+        order = np.argsort(starts, kind='stable')
+
+        columns = {}
+        for name in field_names:
+            parts = []
+            for definition in message_definitions:
+                column = _field_columns(data, definition, name, profile.get(name), dev_by_name)
+                if column is None:
+                    column = np.full(len(definition.starts), np.nan)
+                if name == 'timestamp':
+                    for index, timestamp in definition.compressed_timestamps.items():
+                        column[index] = timestamp
+                    column = column + FIT_EPOCH
+                parts.append(column)
+            columns[name] = np.concatenate(parts)[order] if parts else np.empty(0)
+
+        if message_name == 'record':
+            result[message_name] = columns
+        else:
+            scalars = {}
+            for name, column in columns.items():
+                valid = column[~np.isnan(column)]
+                scalars[name] = valid[-1].item() if len(valid) else None
+            result[message_name] = scalars
+
+    return result
+
+
+def benchmark(paths, repeat=20):
+    """Time summarize_fit_file with the columnar decoder against the fitparse path"""
+    from predictor.scripts.fit_to_csv import summarize_fit_file
+
+    for path in paths:
+        with open(path, 'rb') as file:
+            raw = file.read()
+
+        timings = {}
+        for decoder in ("columnar", "fitparse"):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                summarize_fit_file(raw, decoder=decoder)
+            timings[decoder] = (time.perf_counter() - started) / repeat
+
+        print(f"{path}: columnar {timings['columnar'] * 1000:.2f} ms, fitparse {timings['fitparse'] * 1000:.2f} ms "
+              f"({timings['fitparse'] / timings['columnar']:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    # python -m predictor.scripts.fit_decoder predictor/teon.fit predictor/teon2.fit
+    benchmark(sys.argv[1:] or ["predictor/teon.fit", "predictor/teon2.fit"])
@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import struct
+import argparse
+import numpy as np
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.fit_decoder import FIT_EPOCH, MESSAGE_NUMBERS
+
+RECORD_FIELDS = ('timestamp', 'heart_rate', 'distance', 'steps')
+GENDER_CODES = {"Female": 0, "Male": 1}
+
+# FIT base types: (base type byte, struct code)
+ENUM, UINT8, UINT16, UINT32, UINT32Z, STRING = (0x00, 'B'), (0x02, 'B'), (0x84, 'H'), (0x86, 'I'), (0x8C, 'I'), \
+    (0x07, 's')
+DEVELOPER_DATA_ID = 207
+FIELD_DESCRIPTION = 206
+# Developer field the decoders read the step count from, see fit_decoder.DEFAULT_FIELDS
+STEPS_FIELD_NUMBER = 0
+
+CRC_TABLE = (0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+             0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400)
+
+
+def fit_crc(data, crc=0):
+    """CRC-16 of the FIT protocol"""
+    for byte in data:
+        tmp = CRC_TABLE[crc & 0xF]
+        crc = ((crc >> 4) & 0x0FFF) ^ tmp ^ CRC_TABLE[byte & 0xF]
+        tmp = CRC_TABLE[crc & 0xF]
+        crc = ((crc >> 4) & 0x0FFF) ^ tmp ^ CRC_TABLE[(byte >> 4) & 0xF]
+    return crc
+
+
+def _definition(local_type, global_number, fields, dev_fields=()):
+    """
+    Definition message (little endian).
+
+    Args:
+        fields (list): (field number, base type, size)
+        dev_fields (list): (field number, size, developer data index)
+    """
+    header = 0x40 | (0x20 if dev_fields else 0) | local_type
+    message = struct.pack('<BBBHB', header, 0, 0, global_number, len(fields))
+    message += b''.join(struct.pack('BBB', number, size, base_type[0]) for number, base_type, size in fields)
+    if dev_fields:
+        message += struct.pack('B', len(dev_fields))
+        message += b''.join(struct.pack('BBB', number, size, index) for number, size, index in dev_fields)
+    return message
+
+
+def _message(local_type, fields, values):
+    """Data message with a normal header; values in the order of fields"""
+    parts = [struct.pack('B', local_type)]
+    for (_, base_type, size), value in zip(fields, values):
+        if base_type is STRING:
+            parts.append(value.encode('utf-8')[:size - 1].ljust(size, b'\0'))
+        else:
+            parts.append(struct.pack('<' + base_type[1], value))
+    return b''.join(parts)
+
+
+def _single(local_type, global_number, fields, values):
+    return _definition(local_type, global_number, fields) + _message(local_type, fields, values)
+
+
+def simulate_streams(duration, interval=1, resting_heart_rate=60, target_heart_rate=150, speed=3.0,
+                     cadence=170, seed=0):
+    """
+    Plausible 1/interval Hz streams of an endurance workout: a warm-up ramp to the target
+    heart rate with slow drift and noise, a noisy pace, and steps from the cadence.
+
+    Returns:
+        dict: Arrays 'elapsed' (s), 'heart_rate' (bpm), 'distance' (cumulative m) and
+            'steps' (steps since the previous record)
+    """
+    rng = np.random.default_rng(seed)
+    elapsed = np.arange(0, duration + 1, interval, dtype=np.int64)
+    warm_up = np.clip(elapsed / 600, 0, 1)
+    drift = 0.03 * target_heart_rate * elapsed / max(duration, 1)
+    heart_rate = resting_heart_rate + (target_heart_rate - resting_heart_rate) * warm_up + drift
+    heart_rate += np.cumsum(rng.normal(0, 0.5, len(elapsed))).clip(-8, 8) + rng.normal(0, 1.5, len(elapsed))
+
+    step_time = np.diff(elapsed, prepend=0)
+    pace = np.clip(speed * (0.6 + 0.4 * warm_up) + rng.normal(0, 0.15, len(elapsed)), 0, None)
+    steps = np.rint(cadence / 60 * step_time * (pace > 0.5))
+    return {
+        'elapsed': elapsed,
+        'heart_rate': np.clip(np.rint(heart_rate), 40, 220),
+        'distance': np.cumsum(pace * step_time),
+        'steps': steps,
+    }
+
+
+def generate_fit(duration=3600, interval=1, fields=RECORD_FIELDS, session=True, user_profile=True,
+                 age=30, gender="Male", height=1.80, weight=75.0, start_time=None, seed=0):
+    """
+    Encode a synthetic activity as a FIT file that fit_decoder and fitparse both read.
+
+    Args:
+        duration (int): Activity length in seconds
+        interval (int): Seconds between records (1 is 1 Hz recording)
+        fields (tuple): Record fields to write, any of RECORD_FIELDS (steps are a developer
+            field named "steps", like the sample files)
+        session (bool): Write a session message with the totals
+        user_profile (bool): Write a user_profile message
+        age (int): user_profile age
+        gender (str): user_profile gender, "Male" or "Female"
+        height (float): user_profile height in meters
+        weight (float): user_profile weight in kg
+        start_time (float): Unix time of the first record (now if None)
+        seed (int): Seed of the simulated streams
+
+    Returns:
+        bytes: The FIT file
+    """
+    unknown = set(fields) - set(RECORD_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown record fields {sorted(unknown)}, choose from {RECORD_FIELDS}")
+    start = int(time.time() if start_time is None else start_time) - FIT_EPOCH
+    streams = simulate_streams(duration, interval, seed=seed)
+    timestamps = start + streams['elapsed']
+    end = int(timestamps[-1])
+
+    body = [_single(0, MESSAGE_NUMBERS['file_id'],
+                    [(0, ENUM, 1), (1, UINT16, 2), (2, UINT16, 2), (3, UINT32Z, 4), (4, UINT32, 4)],
+                    [4, 255, 0, seed + 1, start])]
+    if 'steps' in fields:
+        body.append(_single(1, DEVELOPER_DATA_ID, [(3, UINT8, 1)], [0]))
+        body.append(_single(1, FIELD_DESCRIPTION,
+                            [(0, UINT8, 1), (1, UINT8, 1), (2, UINT8, 1), (3, STRING, 16), (8, STRING, 16)],
+                            [0, STEPS_FIELD_NUMBER, UINT16[0], "steps", "steps"]))
+    if user_profile:
+        body.append(_single(1, MESSAGE_NUMBERS['user_profile'],
+                            [(1, ENUM, 1), (2, UINT8, 1), (3, UINT8, 1), (4, UINT16, 2)],
+                            [GENDER_CODES.get(gender, 1), int(age), int(round(height * 100)),
+                             int(round(weight * 10))]))
+
+    # Records are packed as one structured array instead of message by message
+    record_fields = [(number, base_type, size, name) for name, number, base_type, size in (
+        ('timestamp', 253, UINT32, 4), ('heart_rate', 3, UINT8, 1), ('distance', 5, UINT32, 4)) if name in fields]
+    dev_fields = [(STEPS_FIELD_NUMBER, 2, 0)] if 'steps' in fields else []
+    body.append(_definition(2, MESSAGE_NUMBERS['record'], [field[:3] for field in record_fields], dev_fields))
+    dtype = [('header', 'u1')] + [(name, '<' + {1: 'u1', 2: 'u2', 4: 'u4'}[size])
+                                  for _, _, size, name in record_fields]
+    if dev_fields:
+        dtype.append(('steps', '<u2'))
+    records = np.zeros(len(timestamps), dtype=np.dtype(dtype))
+    records['header'] = 2
+    if 'timestamp' in fields:
+        records['timestamp'] = timestamps
+    if 'heart_rate' in fields:
+        records['heart_rate'] = streams['heart_rate']
+    if 'distance' in fields:
+        records['distance'] = np.rint(streams['distance'] * 100)
+    if 'steps' in fields:
+        records['steps'] = streams['steps']
+    body.append(records.tobytes())
+
+    if session:
+        elapsed_ms = (end - start) * 1000
+        calories = int(round((end - start) / 60 * 10))
+        body.append(_single(3, MESSAGE_NUMBERS['session'],
+                            [(253, UINT32, 4), (2, UINT32, 4), (7, UINT32, 4), (8, UINT32, 4), (9, UINT32, 4),
+                             (11, UINT16, 2), (16, UINT8, 1), (17, UINT8, 1)],
+                            [end, start, elapsed_ms, elapsed_ms, int(round(streams['distance'][-1] * 100)),
+                             calories, int(round(streams['heart_rate'].mean())),
+                             int(streams['heart_rate'].max())]))
+    body.append(_single(3, MESSAGE_NUMBERS['activity'],
+                        [(253, UINT32, 4), (1, UINT16, 2), (2, ENUM, 1), (3, ENUM, 1), (4, ENUM, 1)],
+                        [end, 1 if session else 0, 0, 26, 1]))
+
+    data = b''.join(body)
+    header = struct.pack('<BBHI4s', 14, 0x20, 2132, len(data), b'.FIT')
+    header += struct.pack('<H', fit_crc(header))
+    return header + data + struct.pack('<H', fit_crc(data))
+
+
+def write_fit(path, **kwargs):
+    """Write generate_fit(**kwargs) to path; returns the file size in bytes"""
+    data = generate_fit(**kwargs)
+    with open(path, "wb") as file:
+        file.write(data)
+    return len(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic FIT activity")
+    parser.add_argument("output", help="Path of the .fit file to write")
+    parser.add_argument("--duration", type=float, default=60, help="Activity length in minutes")
+    parser.add_argument("--interval", type=int, default=1, help="Seconds between records")
+    parser.add_argument("--fields", nargs="+", choices=RECORD_FIELDS, default=list(RECORD_FIELDS))
+    parser.add_argument("--no-session", action="store_true", help="Leave out the session message")
+    parser.add_argument("--no-user-profile", action="store_true", help="Leave out the user_profile message")
+    parser.add_argument("--age", type=int, default=30)
+    parser.add_argument("--gender", choices=sorted(GENDER_CODES), default="Male")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    size = write_fit(args.output, duration=int(args.duration * 60), interval=args.interval, fields=args.fields,
+                     session=not args.no_session, user_profile=not args.no_user_profile, age=args.age,
+                     gender=args.gender, seed=args.seed)
+    print(f"Wrote {args.output} ({size / 1024:.1f} KiB)")
@@ -1,10 +1,34 @@
 import csv
+from datetime import datetime, timezone
+import numpy as np
 from fitparse import FitFile
+from predictor.scripts.fit_decoder import decode_fit, FIT_EPOCH
+from predictor.scripts.intensity_metrics import intensity_metrics
+from predictor.scripts.telemetry import timed
 
+GENDERS = {0: "Female", 1: "Male"}
 
-def parse_fit_file(fit_path, csv_output_path, age=23, workout_type="Running"):
-    fitfile = FitFile(fit_path)
 
+def summarize_fit_file(fit_source, age=23, workout_type="Running", decoder="columnar", intensity=False,
+                       with_start_time=False):
+    """
+    Reduce a FIT activity to one row of the workout tracker schema.
+
+    Args:
+        fit_source: Path to a .fit file, its bytes or a binary file-like object
+        age: Age used when the file has no user_profile
+        workout_type (str): Workout type of the activity
+        decoder (str): "columnar" for the single-pass decoder in fit_decoder.py,
+            "fitparse" to walk the messages with fitparse
+        intensity (bool): Add the columns of intensity_metrics (best-effort heart rates,
+            time in zones, TRIMP, drift) computed from the record streams
+        with_start_time (bool): Also return when the activity started
+
+    Returns:
+        dict: Row with the workout_fitness_tracker_data.csv columns, or (row, start time) with
+            with_start_time; the start time is the session start_time, else the first record
+            timestamp, as a naive UTC datetime (None if the file has neither)
+    """
     data = {
         "User ID": "N/A",
         "Age": "N/A",
@@ -30,14 +54,86 @@ def parse_fit_file(fit_path, csv_output_path, age=23, workout_type="Running"):
         "HR%": "", "TLI": "", "MET": "", "WEI": ""
     }
 
+    data["Age"] = age
+    data["Workout Type"] = workout_type
+
+    if decoder == "fitparse":
+        records, start_time = _summarize_with_fitparse(fit_source, data)
+    else:
+        records, start_time = _summarize_columns(decode_fit(fit_source), data)
+
+    if intensity:
+        data.update(_intensity_columns(records, data))
+    return (data, start_time) if with_start_time else data
+
+
+def _utc_datetime(unix_seconds):
+    if unix_seconds is None or unix_seconds != unix_seconds:
+        return None
+    return datetime.fromtimestamp(unix_seconds, timezone.utc).replace(tzinfo=None)
+
+
+def _intensity_columns(records, data):
+    try:
+        hr_max = 208 - 0.7 * float(data["Age"])
+        resting_heart_rate = float(data["Resting Heart Rate (bpm)"])
+    except (TypeError, ValueError):
+        hr_max = resting_heart_rate = np.nan
+    return intensity_metrics(records["timestamp"], records["heart_rate"], hr_max, resting_heart_rate,
+                             distance=records["distance"], gender=data["Gender"])
+
+
+def _summarize_columns(decoded, data):
+    records = decoded["record"]
+
+    timestamps = records["timestamp"][~np.isnan(records["timestamp"])]
+    if len(timestamps):
+        data["Workout Duration (mins)"] = round((timestamps[-1] - timestamps[0]) / 60, 2)
+
+    heart_rates = records["heart_rate"][~np.isnan(records["heart_rate"])]
+    if len(heart_rates):
+        data["Heart Rate (bpm)"] = round(float(heart_rates.sum()) / len(heart_rates), 2)
+        data["Resting Heart Rate (bpm)"] = int(heart_rates.min())
+
+    data["Steps Taken"] = int(np.nansum(records["steps"]))
+    data["Distance (km)"] = round(0.1 + float(np.nansum(records["distance"])) / 1000, 2)  # meters to km
+
+    session, profile = decoded["session"], decoded["user_profile"]
+    if session.get("total_calories") is not None:
+        data["Calories Burned"] = int(session["total_calories"])
+    if profile.get("gender") is not None:
+        data["Gender"] = GENDERS.get(int(profile["gender"]), "N/A")
+    if profile.get("age") is not None:
+        data["Age"] = int(profile["age"])
+    if profile.get("weight") is not None:
+        data["Weight (kg)"] = round(profile["weight"], 2)
+    if profile.get("height") is not None:
+        data["Height (cm)"] = round(profile["height"] * 100, 1)
+
+    # Session times are FIT seconds, record timestamps are already Unix seconds
+    if session.get("start_time") is not None:
+        start_time = session["start_time"] + FIT_EPOCH
+    else:
+        start_time = timestamps[0] if len(timestamps) else None
+    return records, _utc_datetime(start_time)
+
+
+def _summarize_with_fitparse(fit_source, data):
+    fitfile = FitFile(fit_source)
+
     heart_rates = []
     total_steps = 0
     total_distance = 0.1
     start_time = None
     end_time = None
+    streams = {"timestamp": [], "heart_rate": [], "distance": []}
 
     for record in fitfile.get_messages("record"):
         values = {field.name: field.value for field in record}
+        timestamp = values.get("timestamp")
+        streams["timestamp"].append(timestamp.timestamp() - FIT_EPOCH if timestamp else np.nan)
+        for name in ("heart_rate", "distance"):
+            streams[name].append(np.nan if values.get(name) is None else values[name])
         if "heart_rate" in values:
             heart_rates.append(values["heart_rate"])
         if "steps" in values:
@@ -59,13 +155,14 @@ def parse_fit_file(fit_path, csv_output_path, age=23, workout_type="Running"):
 
     data["Steps Taken"] = total_steps
     data["Distance (km)"] = round(total_distance, 2)
-    data["Age"] = age
-    data["Workout Type"] = workout_type
 
+    session_start = None
     for msg in fitfile.get_messages():
         if msg.name in ("session", "activity", "file_id", "user_profile"):
             for field in msg:
-                if field.name == "total_calories":
+                if field.name == "start_time" and msg.name == "session" and field.value is not None:
+                    session_start = field.value
+                elif field.name == "total_calories":
                     data["Calories Burned"] = field.value
                 elif field.name == "gender":
                     data["Gender"] = field.value.title()
@@ -75,8 +172,16 @@ def parse_fit_file(fit_path, csv_output_path, age=23, workout_type="Running"):
                     data["Weight (kg)"] = round(field.value, 2)
                 elif field.name == "height":
                     data["Height (cm)"] = round(field.value * 100, 1)
+    # fitparse datetimes are naive UTC
+    return ({name: np.array(values, dtype=np.float64) for name, values in streams.items()},
+            session_start or start_time)
+
+
+def parse_fit_file(fit_path, csv_output_path, age=23, workout_type="Running", decoder="columnar", intensity=False):
+    with timed("fit_parse", workout_type):
+        data = summarize_fit_file(fit_path, age, workout_type, decoder, intensity)
 
-    with open(csv_output_path, mode="a", newline="") as file:
+    with timed("csv_write", workout_type), open(csv_output_path, mode="a", newline="") as file:
         writer = csv.DictWriter(file, fieldnames=data.keys())
         if file.tell() == 0:
             writer.writeheader()
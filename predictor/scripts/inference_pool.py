@@ -0,0 +1,194 @@
+import os
+import time
+import atexit
+import multiprocessing
+import multiprocessing.connection
+import queue
+import threading
+
+from predictor.scripts.classify_user import classify_user
+from predictor.scripts.model_registry import ModelRegistry, WORKOUT_TYPES
+
+# Requests a worker answers; everything except classify is a ModelRegistry method
+WORKER_METHODS = ('classify', 'predict_percentiles', 'evaluate')
+
+
+def exit_with_parent(interval=1.0):
+    """
+    ProcessPoolExecutor initializer: exit the worker once the process that started it is gone.
+
+    Pool workers wait on a queue whose pipe they hold open themselves, so they never see
+    the end of a server killed by a signal and would otherwise live on as orphans.
+
+    Args:
+        interval (float): Seconds between checks of the parent process
+    """
+    parent = os.getppid()
+
+    def watch():
+        while os.getppid() == parent:
+            time.sleep(interval)
+        os._exit(0)
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+def _worker_main(conn, model_dir, engine, workout_types):
+    """Entry point of a worker process: load the models once, then serve requests from conn"""
+    registry = ModelRegistry(model_dir, engine=engine)
+    registry.preload(workout_types)
+    conn.send(('ready', registry.loaded_types()))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        method, args = request
+        try:
+            if method not in WORKER_METHODS:
+                raise ValueError(f"Unknown inference method {method!r}")
+            if method == 'classify':
+                result = classify_user(*args, registry=registry)
+            else:
+                result = getattr(registry, method)(*args)
+            conn.send(('ok', result))
+        except Exception as e:
+            conn.send(('error', e))
+
+
+class _Worker:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.lock = threading.Lock()
+
+
+class InferencePool:
+    def __init__(self, processes, model_dir, engine="auto", workout_types=WORKOUT_TYPES,
+                 start_method="spawn", timeout=30, startup_timeout=120):
+        """
+        Fixed set of worker processes that each hold the loaded per-workout-type models.
+
+        Args:
+            processes (int): Number of worker processes
+            model_dir (str): Directory containing the model artifacts
+            engine (str): Inference engine passed to load_workout_model
+            workout_types (list): Workout types every worker preloads
+            start_method (str): multiprocessing start method for the workers
+            timeout (float): Seconds to wait for a free worker and for a reply
+            startup_timeout (float): Seconds to wait for a (re)started worker to load its models
+        """
+        self.model_dir = model_dir
+        self.engine = engine
+        self.workout_types = list(workout_types)
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.restarts = 0
+        self._context = multiprocessing.get_context(start_method)
+        self._closed = False
+        self._workers = [_Worker(i) for i in range(processes)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._start(worker)
+            self._idle.put(worker)
+
+        self._supervisor = threading.Thread(target=self._supervise, name="inference-supervisor", daemon=True)
+        self._supervisor.start()
+        # Before multiprocessing terminates the workers at exit, which the supervisor would
+        # answer by starting new ones in a dying process
+        atexit.register(self.close)
+
+    def _start(self, worker):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main,
+                                        args=(child_conn, self.model_dir, self.engine, self.workout_types),
+                                        name=f"inference-worker-{worker.index}", daemon=True)
+        process.start()
+        child_conn.close()
+        if worker.process is not None:
+            worker.conn.close()
+            self.restarts += 1
+        worker.process, worker.conn, worker.ready = process, parent_conn, False
+
+    def _restart(self, worker):
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        self._start(worker)
+
+    def _supervise(self):
+        # Restart workers as soon as they die so their models are warm again before the next request
+        while not self._closed:
+            sentinels = {worker.process.sentinel: worker for worker in self._workers}
+            for sentinel in multiprocessing.connection.wait(list(sentinels), timeout=1.0):
+                worker = sentinels[sentinel]
+                with worker.lock:
+                    if not self._closed and worker.process.sentinel == sentinel:
+                        self._restart(worker)
+
+    def _call(self, method, *args):
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("No inference worker became available")
+
+        try:
+            with worker.lock:
+                try:
+                    status, result = self._send(worker, method, args)
+                except (EOFError, OSError) as e:
+                    self._restart(worker)
+                    raise RuntimeError("Inference worker died while handling the request") from e
+        finally:
+            self._idle.put(worker)
+
+        if status == 'error':
+            raise result
+        return result
+
+    def _send(self, worker, method, args):
+        # Called with worker.lock held
+        if not worker.process.is_alive():
+            self._restart(worker)
+        if not worker.ready:
+            if not worker.conn.poll(self.startup_timeout):
+                self._restart(worker)
+                raise TimeoutError("Inference worker did not start in time")
+            worker.conn.recv()
+            worker.ready = True
+
+        worker.conn.send((method, args))
+        if not worker.conn.poll(self.timeout):
+            self._restart(worker)
+            raise TimeoutError(f"Inference worker did not answer within {self.timeout}s")
+        return worker.conn.recv()
+
+    def classify(self, fit_bytes, workout_type, age):
+        """Parse and score a FIT file in a worker, see classify_user"""
+        return self._call('classify', fit_bytes, workout_type, age)
+
+    def predict_percentiles(self, workout_type, workouts):
+        return self._call('predict_percentiles', workout_type, workouts)
+
+    def evaluate(self, workout_type, workouts):
+        return self._call('evaluate', workout_type, workouts)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._workers:
+            with worker.lock:
+                try:
+                    worker.conn.send(None)
+                except (OSError, ValueError):
+                    pass
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+                worker.conn.close()
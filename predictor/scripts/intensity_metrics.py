@@ -0,0 +1,113 @@
+import numpy as np
+
+# Lower bounds of heart-rate zones 1-5 as a fraction of HRmax; zone 0 is everything below
+HR_ZONE_BOUNDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+# Windows of the best-effort average heart rates, in minutes
+BEST_EFFORT_MINUTES = (1, 5, 20)
+
+# Longest time (s) a record's values are held; longer gaps are pauses and are not counted
+MAX_SAMPLE_GAP = 10
+
+# Banister TRIMP weighting factor by gender (the male factor when unknown)
+TRIMP_FACTORS = {"Male": 1.92, "Female": 1.67}
+
+
+def resample_records(timestamps, *columns, max_gap=MAX_SAMPLE_GAP):
+    """
+    Resample record streams to one value per second by holding each record until the next one.
+
+    Records without a timestamp or without a value in the first column are dropped.
+
+    Args:
+        timestamps (np.ndarray): Record timestamps in seconds
+        *columns (np.ndarray): Record streams to resample, the first one decides which records are kept
+        max_gap (int): Longest time a record is held
+
+    Returns:
+        list: One 1 Hz array per column
+    """
+    valid = ~np.isnan(timestamps) & ~np.isnan(columns[0])
+    timestamps = timestamps[valid]
+    if len(timestamps) == 0:
+        return [np.empty(0) for _ in columns]
+
+    hold = np.diff(timestamps, append=timestamps[-1] + 1)
+    hold = np.clip(np.rint(hold), 0, max_gap).astype(np.int64)
+    return [np.repeat(column[valid], hold) for column in columns]
+
+
+def best_average(series, window):
+    """
+    Highest mean over any window of consecutive samples, in O(n) with a cumulative sum.
+
+    Args:
+        series (np.ndarray): 1 Hz samples
+        window (int): Window length in samples
+
+    Returns:
+        float: Best window mean, NaN if the series is shorter than the window
+    """
+    if len(series) < window:
+        return np.nan
+    cumulative = np.concatenate(([0.0], np.cumsum(series, dtype=np.float64)))
+    return float((cumulative[window:] - cumulative[:-window]).max() / window)
+
+
+def intensity_metrics(timestamps, heart_rate, hr_max, resting_heart_rate, distance=None, gender=None):
+    """
+    Intensity metrics of one activity from its record streams.
+
+    Args:
+        timestamps (np.ndarray): Record timestamps in seconds (NaN where missing)
+        heart_rate (np.ndarray): Record heart rates in bpm (NaN where missing)
+        hr_max (float): Maximum heart rate the zones and TRIMP are relative to
+        resting_heart_rate (float): Resting heart rate for TRIMP
+        distance (np.ndarray): Cumulative record distances in meters, for aerobic decoupling
+        gender (str): "Male" or "Female", selects the TRIMP weighting factor
+
+    Returns:
+        dict: Best-effort heart rates, minutes per zone, TRIMP, heart-rate drift and aerobic
+            decoupling, with "N/A" for metrics the streams do not allow
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    heart_rate = np.asarray(heart_rate, dtype=np.float64)
+    if distance is None:
+        distance = np.full(len(timestamps), np.nan)
+    hr, dist = resample_records(timestamps, heart_rate, np.asarray(distance, dtype=np.float64))
+
+    metrics = {}
+    for minutes in BEST_EFFORT_MINUTES:
+        metrics[f"Best {minutes} min HR (bpm)"] = best_average(hr, minutes * 60)
+
+    # Time in zones: one searchsorted and one bincount over the 1 Hz series
+    zone_minutes = np.full(len(HR_ZONE_BOUNDS) + 1, np.nan)
+    if np.isfinite(hr_max):
+        zones = np.searchsorted(np.asarray(HR_ZONE_BOUNDS) * hr_max, hr, side="right")
+        zone_minutes = np.bincount(zones, minlength=len(HR_ZONE_BOUNDS) + 1) / 60
+    for zone, minutes in enumerate(zone_minutes):
+        metrics[f"Zone {zone} (mins)"] = float(minutes)
+
+    # Banister TRIMP: minutes weighted by heart-rate reserve
+    metrics["TRIMP"] = np.nan
+    if np.isfinite(hr_max) and np.isfinite(resting_heart_rate) and hr_max > resting_heart_rate:
+        reserve = np.clip((hr - resting_heart_rate) / (hr_max - resting_heart_rate), 0.0, 1.0)
+        factor = TRIMP_FACTORS.get(gender, TRIMP_FACTORS["Male"])
+        metrics["TRIMP"] = float((reserve * 0.64 * np.exp(factor * reserve)).sum() / 60)
+
+    # Cardiac drift: second half against first half, by elapsed (not paused) time
+    half = len(hr) // 2
+    metrics["HR Drift (%)"] = metrics["Aerobic Decoupling (%)"] = np.nan
+    if half:
+        first_hr, second_hr = hr[:half].mean(), hr[half:2 * half].mean()
+        metrics["HR Drift (%)"] = float((second_hr - first_hr) / first_hr * 100)
+
+        # Efficiency factor (speed per beat) needs the distance stream at the half boundaries
+        ends = dist[[0, half - 1, half, 2 * half - 1]]
+        if not np.isnan(ends).any():
+            first_ef = (ends[1] - ends[0]) / first_hr
+            second_ef = (ends[3] - ends[2]) / second_hr
+            if first_ef > 0:
+                metrics["Aerobic Decoupling (%)"] = float((first_ef - second_ef) / first_ef * 100)
+
+    return {key: "N/A" if np.isnan(value) else round(value, 2) for key, value in metrics.items()}
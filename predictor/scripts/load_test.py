@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.fit_generator import generate_fit
+from predictor.scripts.model_registry import WORKOUT_TYPES
+
+
+def multipart_body(fit_bytes, fields):
+    """
+    Encode a multipart/form-data upload.
+
+    Args:
+        fit_bytes (bytes): Content of the "file" part
+        fields (dict): Other form fields, e.g. workout_type and age
+
+    Returns:
+        tuple: (body, content type header)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="activity.fit"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n'.encode() + fit_bytes + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def serve_app(config=None):
+    """
+    Start the Flask app on a free local port in a threaded werkzeug server.
+
+    Args:
+        config (dict): create_app overrides
+
+    Returns:
+        tuple: (base URL, server); stop it with server.shutdown()
+    """
+    from werkzeug.serving import make_server
+    sys.path.insert(0, os.path.join(base_dir, "flask"))
+    from app import create_app
+
+    # One access log line per upload would bury the results
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, create_app(config), threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def post_upload(url, body, content_type, timeout=60):
+    """
+    POST one upload on a new connection.
+
+    Returns:
+        tuple: (status, latency in seconds, cache hit, response body)
+    """
+    parts = urlsplit(url)
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    try:
+        connection.request('POST', parts.path.rstrip('/') + '/upload', body=body,
+                           headers={'Content-Type': content_type})
+        response = connection.getresponse()
+        payload = response.read()
+        status, hit = response.status, response.getheader('X-Cache') == 'HIT'
+    except (OSError, http.client.HTTPException) as e:
+        status, hit, payload = None, False, str(e).encode()
+    finally:
+        connection.close()
+    return status, time.perf_counter() - started, hit, payload
+
+
+def run_load(url, uploads, concurrency, requests, timeout=60):
+    """
+    Send `requests` uploads with `concurrency` requests in flight at a time.
+
+    Args:
+        url (str): Base URL of the app
+        uploads (list): (body, content type) pairs, sent round robin
+        concurrency (int): Client threads
+        requests (int): Number of uploads
+        timeout (float): Socket timeout of a request in seconds
+
+    Returns:
+        dict: Throughput (requests/s), latency percentiles (ms) of the successful requests,
+            the error count with the first error, and the cache hit count
+    """
+    def send(index):
+        return post_upload(url, *uploads[index % len(uploads)], timeout=timeout)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(send, range(requests)))
+    wall_time = time.perf_counter() - started
+
+    latencies = np.array([latency for status, latency, _, _ in outcomes if status == 200]) * 1000
+    errors = [(status, payload) for status, _, _, payload in outcomes if status != 200]
+    result = {
+        'requests': requests,
+        'errors': len(errors),
+        'cache_hits': sum(hit for _, _, hit, _ in outcomes),
+        'wall_s': wall_time,
+        'throughput': len(latencies) / wall_time,
+    }
+    for q in (50, 95, 99):
+        result[f'p{q}_ms'] = float(np.percentile(latencies, q)) if len(latencies) else float('nan')
+    if errors:
+        status, payload = errors[0]
+        result['first_error'] = f"{status}: {payload[:200].decode('utf-8', 'replace')}"
+    return result
+
+
+def sweep(url, durations, concurrencies, requests, variants=4, workout_type="Running", age=30, timeout=60):
+    """
+    Load-test /upload for every combination of activity length and concurrency.
+
+    Each length gets `variants` distinct synthetic files (different seeds) so a result cache
+    on the server only answers repeats; every file is uploaded once as a warm-up first.
+
+    Args:
+        url (str): Base URL of the app
+        durations (list): Activity lengths in minutes, i.e. file sizes at 1 Hz
+        concurrencies (list): Numbers of requests in flight
+        requests (int): Uploads per combination
+        variants (int): Distinct files per length
+        workout_type (str): Workout type of the uploads
+        age (int): Age form field of the uploads
+        timeout (float): Socket timeout of a request in seconds
+
+    Yields:
+        dict: Result of run_load with duration_min, size_kib and concurrency
+    """
+    for duration in durations:
+        fit_files = [generate_fit(duration=int(duration * 60), seed=seed, age=age) for seed in range(variants)]
+        uploads = [multipart_body(fit_bytes, {'workout_type': workout_type, 'age': age}) for fit_bytes in fit_files]
+        run_load(url, uploads, 1, len(uploads), timeout)
+        for concurrency in concurrencies:
+            result = run_load(url, uploads, concurrency, requests, timeout)
+            result.update(duration_min=duration, size_kib=len(fit_files[0]) / 1024, concurrency=concurrency)
+            yield result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test /upload with synthetic FIT files")
+    parser.add_argument("--url", default=None,
+                        help="Base URL of a running app (run it with RESULT_CACHE_SIZE=0); "
+                             "by default the app is started locally")
+    parser.add_argument("--durations", type=float, nargs="+", default=[15, 60, 240],
+                        help="Activity lengths in minutes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Requests in flight")
+    parser.add_argument("--requests", type=int, default=100, help="Uploads per combination")
+    parser.add_argument("--variants", type=int, default=4, help="Distinct files per activity length")
+    parser.add_argument("--workout-type", choices=WORKOUT_TYPES, default="Running")
+    parser.add_argument("--age", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds per request")
+    parser.add_argument("--model-dir", default=os.path.join(base_dir, "models"),
+                        help="Models of the locally started app")
+    parser.add_argument("--inference-processes", type=int, default=0,
+                        help="INFERENCE_PROCESSES of the locally started app")
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        url, server = serve_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'MODEL_DIR': args.model_dir,
+                                 'RESULT_CACHE_SIZE': 0, 'BULK_PARSE_PROCESSES': 0,
+                                 'INFERENCE_PROCESSES': args.inference_processes})
+    print(f"Load-testing {url}/upload with {args.requests} {args.workout_type} uploads per row\n")
+    print(f"{'minutes':>8} {'KiB':>8} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'hits':>5}")
+
+    results = []
+    try:
+        for result in sweep(url, args.durations, args.concurrency, args.requests, args.variants,
+                            args.workout_type, args.age, args.timeout):
+            results.append(result)
+            print(f"{result['duration_min']:8g} {result['size_kib']:8.1f} {result['concurrency']:5d} "
+                  f"{result['throughput']:8.1f} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} "
+                  f"{result['p99_ms']:9.1f} {result['errors']:7d} {result['cache_hits']:5d}")
+            if 'first_error' in result:
+                print(f"  first error: {result['first_error']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({'url': url, 'workout_type': args.workout_type, 'results': results}, file, indent=2)
+        print(f"\nResults written to {args.output}")
+    if any(result['errors'] for result in results):
+        sys.exit(1)
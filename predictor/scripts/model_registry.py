@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from predictor.scripts.create_models import load_workout_model
+from predictor.scripts.numpy_inference import numpy_model_path
+from predictor.scripts.telemetry import timed
+
+logger = logging.getLogger(__name__)
+
+WORKOUT_TYPES = ['Cardio', 'Cycling', 'HIIT', 'Running', 'Strength', 'Yoga']
+
+
+class ModelRegistry:
+    def __init__(self, model_dir, max_size=None, engine="auto"):
+        """
+        Process-wide cache of loaded workout models, keyed by workout type.
+
+        Args:
+            model_dir (str): Directory containing the <type>.h5 and <type>_attrs.pkl files
+            max_size (int): Maximum number of models kept in memory (None for unbounded).
+                When the limit is reached the least recently used model is evicted.
+            engine (str): Inference engine passed to load_workout_model
+        """
+        self.model_dir = model_dir
+        self.max_size = max_size
+        self.engine = engine
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def model_base_path(self, workout_type):
+        if not workout_type or os.path.basename(workout_type) != workout_type:
+            raise FileNotFoundError(f"Invalid workout type {workout_type!r}")
+        return os.path.join(self.model_dir, workout_type)
+
+    def _artifact_paths(self, workout_type):
+        base_path = self.model_base_path(workout_type)
+        return [f"{base_path}.h5", f"{base_path}_attrs.pkl", numpy_model_path(base_path)]
+
+    def _artifact_mtimes(self, workout_type):
+        # A missing file counts as its own state, so exporting or deleting a
+        # NumPy copy also triggers a reload
+        mtimes = tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                       for path in self._artifact_paths(workout_type))
+        if not any(mtimes):
+            raise FileNotFoundError(f"No model artifacts found for {workout_type} in {self.model_dir}")
+        return mtimes
+
+    def model_version(self, workout_type):
+        """
+        Identify the artifacts currently on disk for a workout type without loading them.
+
+        Returns:
+            str: Changes whenever a model file is written, exported or removed
+        """
+        mtimes = self._artifact_mtimes(workout_type)
+        return hashlib.sha1(repr((self.engine, mtimes)).encode("utf-8")).hexdigest()[:16]
+
+    def preload(self, workout_types=WORKOUT_TYPES):
+        """
+        Load the models for the given workout types up front.
+
+        Args:
+            workout_types (list): Workout types to load
+
+        Returns:
+            list: Workout types that were loaded successfully
+        """
+        loaded = []
+        for workout_type in workout_types:
+            try:
+                self.get(workout_type)
+                loaded.append(workout_type)
+            except Exception as e:
+                logger.warning("Error preloading model", extra={'workout_type': workout_type, 'error': str(e)})
+        return loaded
+
+    def get(self, workout_type):
+        """
+        Return the loaded model for a workout type, reloading it if the artifacts
+        on disk have changed since it was loaded.
+
+        Args:
+            workout_type (str): Workout type, e.g. "Running"
+
+        Returns:
+            The loaded model returned by load_workout_model
+        """
+        mtimes = self._artifact_mtimes(workout_type)
+
+        with self._lock:
+            entry = self._models.get(workout_type)
+            if entry is not None and entry[0] == mtimes:
+                self._models.move_to_end(workout_type)
+                return entry[1]
+
+        # Load outside the lock so a slow load does not block lookups of other types
+        with timed("model_load", workout_type):
+            model = load_workout_model(self.model_base_path(workout_type), engine=self.engine)
+
+        with self._lock:
+            self._models[workout_type] = (mtimes, model)
+            self._models.move_to_end(workout_type)
+            if self.max_size is not None:
+                while len(self._models) > self.max_size:
+                    self._models.popitem(last=False)
+        return model
+
+    def predict_percentiles(self, workout_type, workouts):
+        return self.get(workout_type).predict_percentiles(workouts)
+
+    def evaluate(self, workout_type, workouts):
+        return self.get(workout_type).evaluate(workouts)
+
+    def loaded_types(self):
+        with self._lock:
+            return list(self._models.keys())
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
@@ -0,0 +1,242 @@
+import os
+import sys
+import numpy as np
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0.0),
+    'sigmoid': lambda x: 0.5 * (1.0 + np.tanh(0.5 * x)),
+    'tanh': np.tanh,
+    'linear': lambda x: x,
+}
+
+
+class NumpyPercentileNetwork:
+    def __init__(self, weights, biases, activations, scaler_mean, scaler_scale):
+        """
+        Pure NumPy forward pass of the Dense stack built by WorkoutPercentileModel._build_model.
+
+        The StandardScaler is folded into the first layer, so predict() takes raw
+        (unscaled) feature rows.
+
+        Args:
+            weights (list): Kernel matrices of the Dense layers, in order
+            biases (list): Bias vectors of the Dense layers, in order
+            activations (list): Activation names of the Dense layers, in order
+            scaler_mean (np.ndarray): StandardScaler mean_ of the training data
+            scaler_scale (np.ndarray): StandardScaler scale_ of the training data
+        """
+        self.weights = [np.asarray(w, dtype=np.float64) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float64) for b in biases]
+        self.activations = [ACTIVATIONS[name] for name in activations]
+        self.activation_names = list(activations)
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+
+        # ((x - mean) / scale) @ W + b  ==  x @ (W / scale) + (b - (mean / scale) @ W)
+        first_w, first_b = self.weights[0], self.biases[0]
+        self._layers = [(first_w / self.scaler_scale[:, None],
+                         first_b - (self.scaler_mean / self.scaler_scale) @ first_w)]
+        self._layers.extend(zip(self.weights[1:], self.biases[1:]))
+
+    def predict(self, input_data):
+        """
+        Run the network on raw feature rows.
+
+        Args:
+            input_data (np.ndarray): Array of shape (n, 5) with unscaled features
+
+        Returns:
+            np.ndarray: Array of shape (n, 1) with outputs in the 0-1 range
+        """
+        x = np.asarray(input_data, dtype=np.float64)
+        for (w, b), activation in zip(self._layers, self.activations):
+            x = activation(x @ w + b)
+        return x
+
+
+def rank_percentiles(scores, sorted_scores=None):
+    """
+    scipy.stats.percentileofscore(sorted_scores, score) (kind='rank') for every score at once.
+
+    Args:
+        scores (np.ndarray): Scores to rank
+        sorted_scores (np.ndarray): Sorted reference scores (np.sort(scores) if None)
+
+    Returns:
+        np.ndarray: Percentiles (0-100), O(log n) per score
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if sorted_scores is None:
+        sorted_scores = np.sort(scores)
+    left = np.searchsorted(sorted_scores, scores, side='left')
+    right = np.searchsorted(sorted_scores, scores, side='right')
+    return (left + right + (right > left)) * (50.0 / len(sorted_scores))
+
+
+class EmpiricalPercentileModel:
+    def __init__(self, composite_mean, composite_scale, sorted_scores):
+        """
+        Model-free scorer: ranks a workout's composite score against the training data.
+
+        Args:
+            composite_mean (np.ndarray): Mean of each feature over the training data
+            composite_scale (np.ndarray): Standard deviation of each feature over the training data
+            sorted_scores (np.ndarray): Sorted composite scores of the training workouts
+        """
+        self.composite_mean = np.asarray(composite_mean, dtype=np.float64)
+        self.composite_scale = np.asarray(composite_scale, dtype=np.float64)
+        self.sorted_scores = np.asarray(sorted_scores, dtype=np.float64)
+
+    def predict(self, input_data):
+        """Same contract as NumpyPercentileNetwork.predict: raw rows in, (n, 1) in the 0-1 range out"""
+        x = np.asarray(input_data, dtype=np.float64)
+        scores = ((x - self.composite_mean) / self.composite_scale).mean(axis=1)
+        return (rank_percentiles(scores, self.sorted_scores) / 100)[:, None]
+
+
+def numpy_model_path(model_base_path):
+    return f"{model_base_path}_numpy.npz"
+
+
+def export_numpy_model(model_base_path, keras_model=None, attrs=None, atol=1e-5):
+    """
+    Export the weights and scaler of a trained model to <base>_numpy.npz
+
+    Args:
+        model_base_path (str): Base path of the model files (without extensions)
+        keras_model: Trained Keras model (loaded from <base>.h5 if not given)
+        attrs (dict): Saved attributes with 'features', 'top_metrics' and 'scaler'
+            (loaded from <base>_attrs.pkl if not given)
+        atol (float): Maximum allowed difference between Keras and NumPy outputs
+
+    Returns:
+        str: Path of the written .npz file
+    """
+    if keras_model is None:
+        import tensorflow as tf
+        keras_model = tf.keras.models.load_model(f"{model_base_path}.h5", compile=False)
+    if attrs is None:
+        import joblib
+        attrs = joblib.load(f"{model_base_path}_attrs.pkl")
+
+    weights, biases, activations = [], [], []
+    for layer in keras_model.layers:
+        layer_weights = layer.get_weights()
+        if not layer_weights:
+            # Dropout is a no-op at inference time
+            continue
+        weights.append(layer_weights[0])
+        biases.append(layer_weights[1])
+        activations.append(layer.activation.__name__)
+
+    scaler = attrs['scaler']
+    n_features = len(attrs['features'])
+    scaler_mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+    scaler_scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+
+    # Check the NumPy forward pass against Keras before writing anything
+    network = NumpyPercentileNetwork(weights, biases, activations, scaler_mean, scaler_scale)
+    rng = np.random.default_rng(42)
+    sample = scaler_mean + rng.standard_normal((64, n_features)) * scaler_scale
+    expected = keras_model.predict(scaler.transform(sample), verbose=0)
+    max_diff = float(np.max(np.abs(network.predict(sample) - expected)))
+    if max_diff > atol:
+        raise ValueError(f"NumPy output differs from Keras by {max_diff:.2e} (tolerance {atol:.0e})")
+
+    arrays = {
+        'features': np.array(attrs['features']),
+        'top_metric_values': np.array([attrs['top_metrics'][feat] for feat in attrs['features']]),
+        'activations': np.array(activations),
+        'scaler_mean': scaler_mean,
+        'scaler_scale': scaler_scale,
+    }
+    for i, (w, b) in enumerate(zip(weights, biases)):
+        arrays[f'W{i}'] = w
+        arrays[f'b{i}'] = b
+    # Reference data for the empirical scoring engine, when the model was trained with it
+    for key in ('composite_mean', 'composite_scale', 'sorted_scores'):
+        if key in attrs:
+            arrays[key] = np.asarray(attrs[key], dtype=np.float64)
+    # Quantile sketch of the reference workouts, for online updates
+    arrays.update(attrs.get('reference_sketch', {}))
+
+    output_path = numpy_model_path(model_base_path)
+    np.savez(output_path, **arrays)
+    return output_path
+
+
+def update_numpy_model(model_base_path, **arrays):
+    """
+    Replace or add arrays in <base>_numpy.npz, keeping every other array.
+
+    The file is rewritten under a temporary name and moved into place, so a
+    concurrent load_numpy_model sees either the old or the new file.
+
+    Args:
+        model_base_path (str): Base path of the model files (without extensions)
+        **arrays: Arrays to store, by name
+
+    Returns:
+        str: Path of the written .npz file
+    """
+    output_path = numpy_model_path(model_base_path)
+    with np.load(output_path, allow_pickle=False) as data:
+        stored = {key: data[key] for key in data.files}
+    stored.update({key: np.asarray(value) for key, value in arrays.items()})
+
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        np.savez(file, **stored)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def load_numpy_model(model_base_path):
+    """
+    Load a model exported by export_numpy_model
+
+    Args:
+        model_base_path (str): Base path of the model files (without extensions)
+
+    Returns:
+        tuple: (NumpyPercentileNetwork, features list, top_metrics dict)
+    """
+    with np.load(numpy_model_path(model_base_path), allow_pickle=False) as data:
+        features = [str(feat) for feat in data['features']]
+        top_metrics = dict(zip(features, data['top_metric_values'].tolist()))
+        n_layers = len(data['activations'])
+        network = NumpyPercentileNetwork(
+            [data[f'W{i}'] for i in range(n_layers)],
+            [data[f'b{i}'] for i in range(n_layers)],
+            [str(name) for name in data['activations']],
+            data['scaler_mean'],
+            data['scaler_scale'])
+    return network, features, top_metrics
+
+
+def load_empirical_model(model_base_path):
+    """
+    Load the empirical scorer stored in <base>_numpy.npz
+
+    Args:
+        model_base_path (str): Base path of the model files (without extensions)
+
+    Returns:
+        tuple: (EmpiricalPercentileModel, features list, top_metrics dict)
+    """
+    with np.load(numpy_model_path(model_base_path), allow_pickle=False) as data:
+        if 'sorted_scores' not in data:
+            raise ValueError(f"{numpy_model_path(model_base_path)} has no empirical reference scores")
+        features = [str(feat) for feat in data['features']]
+        top_metrics = dict(zip(features, data['top_metric_values'].tolist()))
+        model = EmpiricalPercentileModel(data['composite_mean'], data['composite_scale'], data['sorted_scores'])
+    return model, features, top_metrics
+
+
+if __name__ == "__main__":
+    # Export every trained model in a directory: python numpy_inference.py ../models
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "../models"
+    for file_name in sorted(os.listdir(model_dir)):
+        if file_name.endswith(".h5"):
+            base_path = os.path.join(model_dir, file_name[:-len(".h5")])
+            print(f"Exported {export_numpy_model(base_path)}")
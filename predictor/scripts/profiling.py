@@ -0,0 +1,192 @@
+import os
+import re
+import sys
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import argparse
+import functools
+import threading
+
+PROFILE_SUFFIX = ".prof"
+
+# Profiles of scoring calls outside Flask (CLI, inference and parser workers) go to this
+# directory, sampled at PROFILE_RATE_ENV (default 1.0)
+PROFILE_DIR_ENV = "PREDICTOR_PROFILE_DIR"
+PROFILE_RATE_ENV = "PREDICTOR_PROFILE_RATE"
+
+SORT_KEYS = ("tottime", "cumtime", "ncalls")
+
+_active = threading.local()
+
+
+def _safe_label(label):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(label))[:64] or "profile"
+
+
+class RequestProfile:
+    def __init__(self, directory, label):
+        """
+        cProfile capture of one request or call, written to <directory>/<time>-<label>-<id>.prof.
+
+        Profiles do not nest: while a thread is being profiled, further captures in that
+        thread (e.g. classify_user inside a profiled /upload) are no-ops.
+
+        Args:
+            directory (str): Directory the profile is written to
+            label (str): Part of the file name, e.g. "upload-Running"
+        """
+        self.directory = directory
+        self.label = label
+        self.path = None
+        self._profiler = None
+
+    def start(self):
+        if getattr(_active, "profile", None) is not None:
+            return self
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (or debugger) owns the interpreter's profiling hook
+            return self
+        self._profiler = profiler
+        _active.profile = self
+        return self
+
+    def stop(self):
+        """Stop profiling and write the profile; returns its path, None if nothing was captured"""
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        _active.profile = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{_safe_label(self.label)}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+        self.path = os.path.join(self.directory, name)
+        temp_path = f"{self.path}.tmp"
+        self._profiler.dump_stats(temp_path)
+        os.replace(temp_path, self.path)
+        self._profiler = None
+        return self.path
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+def profiled(label):
+    """
+    Decorator profiling calls into PREDICTOR_PROFILE_DIR when that variable is set.
+
+    The first positional argument after the FIT source (the workout type of the scoring
+    functions) is added to the label. Without the variable the cost is one environment lookup.
+
+    Args:
+        label (str): Label of the profiles, e.g. "classify_user"
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            directory = os.environ.get(PROFILE_DIR_ENV)
+            if not directory or random.random() >= float(os.environ.get(PROFILE_RATE_ENV, 1.0)):
+                return func(*args, **kwargs)
+            workout_type = args[1] if len(args) > 1 else kwargs.get("workout_type", "")
+            with RequestProfile(directory, f"{label}-{workout_type}"):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def find_profiles(paths, pattern=None):
+    """
+    Profile files in the given files and directories.
+
+    Args:
+        paths (list): .prof files or directories containing them
+        pattern (str): Only files whose name contains this string (e.g. a workout type)
+
+    Returns:
+        list: Sorted profile paths
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(os.path.join(path, name) for name in os.listdir(path) if name.endswith(PROFILE_SUFFIX))
+        elif os.path.isfile(path):
+            found.append(path)
+    return sorted(path for path in found if pattern is None or pattern in os.path.basename(path))
+
+
+def aggregate_profiles(profile_paths, sort="tottime", limit=25):
+    """
+    Merge profiles and rank their functions.
+
+    Args:
+        profile_paths (list): .prof files, e.g. from find_profiles
+        sort (str): "tottime" (time in the function itself), "cumtime" or "ncalls"
+        limit (int): Number of functions returned
+
+    Returns:
+        list: Dicts with function, ncalls, tottime, cumtime and the share of the total
+            time and the number of profiles the function appears in, hottest first
+    """
+    if not profile_paths:
+        return []
+    appearances = {}
+    for path in profile_paths:
+        for function in pstats.Stats(path).stats:
+            appearances[function] = appearances.get(function, 0) + 1
+
+    stats = pstats.Stats(*profile_paths)
+    total = stats.total_tt or 1.0
+    rows = []
+    for function, (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        filename, line, name = function
+        rows.append({
+            'function': f"{filename}:{line}({name})" if line else name,
+            'ncalls': ncalls,
+            'tottime': tottime,
+            'cumtime': cumtime,
+            'share': tottime / total,
+            'profiles': appearances[function]
+        })
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:limit]
+
+
+def _short_path(function):
+    # Keep the package-relative part of site-packages and repository paths
+    for marker in ("site-packages" + os.sep, os.sep + "predictor" + os.sep, os.sep + "flask" + os.sep + "app"):
+        index = function.rfind(marker)
+        if index >= 0:
+            return function[index + (len(marker) if marker.startswith("site") else 1):]
+    return function
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank the hottest functions of captured request profiles")
+    parser.add_argument("paths", nargs="+", help="Profile files or directories containing them")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="tottime")
+    parser.add_argument("--limit", type=int, default=25, help="Number of functions to show")
+    parser.add_argument("--match", default=None, help="Only profiles whose file name contains this, e.g. Running")
+    args = parser.parse_args()
+
+    profile_paths = find_profiles(args.paths, args.match)
+    if not profile_paths:
+        print("No profiles found")
+        sys.exit(1)
+
+    rows = aggregate_profiles(profile_paths, args.sort, args.limit)
+    total = pstats.Stats(*profile_paths).total_tt
+    print(f"{len(profile_paths)} profiles, {total * 1000:.1f} ms in total, "
+          f"{total / len(profile_paths) * 1000:.1f} ms per profile\n")
+    print(f"{'tottime ms':>11} {'share':>6} {'cumtime ms':>11} {'ncalls':>9} {'in':>5}  function")
+    for row in rows:
+        print(f"{row['tottime'] * 1000:11.2f} {row['share']:6.1%} {row['cumtime'] * 1000:11.2f} {row['ncalls']:9d} "
+              f"{row['profiles']:5d}  {_short_path(row['function'])}")
@@ -0,0 +1,249 @@
+import numpy as np
+from predictor.scripts.numpy_inference import rank_percentiles
+
+# Rows kept exactly before the sketch starts compacting; the compacted levels stay below about 3 * k rows
+DEFAULT_SKETCH_SIZE = 2048
+
+# Length of the sorted_scores grid derived from a compacted sketch
+SORTED_SCORES_SIZE = 4096
+
+# Share of the workouts kept uncompacted as candidates for the top 10% (top_metrics); the
+# margin over 10% absorbs the drift of the composite scale while workouts keep arriving
+TOP_CANDIDATE_FRACTION = 0.15
+
+
+def standard_scale(variance):
+    """Standard deviation as StandardScaler.scale_, which leaves constant features unscaled"""
+    scale = np.sqrt(variance)
+    scale[scale == 0.0] = 1.0
+    return scale
+
+
+def merge_moments(count, mean, variance, batch_count, batch_mean, batch_variance):
+    """Chan et al. pairwise merge of two (count, mean, population variance) summaries"""
+    total = count + batch_count
+    if total == 0:
+        return 0, mean, variance
+    delta = batch_mean - mean
+    new_mean = mean + delta * (batch_count / total)
+    m2 = variance * count + batch_variance * batch_count + delta ** 2 * (count * batch_count / total)
+    return total, new_mean, m2 / total
+
+
+def reference_statistics(reference_data, features, composite_mean=None, composite_scale=None):
+    """
+    Compute the percentile reference of a workout type from its workouts.
+
+    Args:
+        reference_data (np.ndarray): Array of shape (n, len(features)) with every reference workout
+        features (list): Feature names, in the column order of reference_data
+        composite_mean (np.ndarray): Feature means (computed from reference_data if None)
+        composite_scale (np.ndarray): Feature standard deviations (computed from reference_data if None)
+
+    Returns:
+        dict: composite_mean, composite_scale, sorted_scores, percentiles (of each
+            reference workout), top_mask (rows in the top 10%) and top_metrics
+    """
+    if composite_mean is None:
+        composite_mean = reference_data.mean(axis=0)
+        composite_scale = standard_scale(reference_data.var(axis=0))
+
+    composite_scores = ((reference_data - composite_mean) / composite_scale).mean(axis=1)
+    sorted_scores = np.sort(composite_scores)
+    percentiles = rank_percentiles(composite_scores, sorted_scores)
+
+    top_mask = percentiles >= np.percentile(percentiles, 90)
+    top_medians = np.nanmedian(reference_data[top_mask], axis=0)
+    return {
+        'composite_mean': composite_mean,
+        'composite_scale': composite_scale,
+        'sorted_scores': sorted_scores,
+        'percentiles': percentiles,
+        'top_mask': top_mask,
+        'top_metrics': {feat: float(value) for feat, value in zip(features, top_medians)},
+    }
+
+
+class ReferenceSketch:
+    def __init__(self, n_features, k=DEFAULT_SKETCH_SIZE, seed=42):
+        """
+        Mergeable KLL-style quantile sketch of the reference workouts of one workout type.
+
+        The running mean and variance that define the composite score are tracked exactly.
+        Up to k rows are kept as they are and all statistics are exact; beyond that, rows
+        are compacted level by level (a row at level h stands for 2**h workouts) and
+        sorted_scores is approximate: its percentiles are off by about one percentage
+        point at the default k. top_metrics stays exact (up to the drift of the composite
+        scale) because the highest-scoring TOP_CANDIDATE_FRACTION of the workouts is kept
+        uncompacted as well, so memory grows with the rows (up to about 19% of them are
+        kept) rather than staying at about 3 * k rows.
+
+        Args:
+            n_features (int): Number of feature columns
+            k (int): Capacity of the largest level
+            seed (int): Seed of the compaction coin flips
+        """
+        self.k = k
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.variance = np.zeros(n_features)
+        self._levels = [np.empty((0, n_features))]
+        self._top = np.empty((0, n_features))
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def composite_scale(self):
+        return standard_scale(self.variance)
+
+    def is_exact(self):
+        """True while every workout is kept uncompacted"""
+        return len(self._levels) == 1
+
+    def _capacity(self, level):
+        depth = len(self._levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _scores(self, rows):
+        return ((rows - self.mean) / self.composite_scale).mean(axis=1)
+
+    def _compress(self):
+        while True:
+            for level, rows in enumerate(self._levels):
+                if len(rows) > self._capacity(level):
+                    break
+            else:
+                return
+
+            if level + 1 == len(self._levels):
+                self._levels.append(np.empty((0, rows.shape[1])))
+            rows = rows[np.argsort(self._scores(rows), kind='stable')]
+            # Every other row moves up with double weight; an odd row stays behind
+            odd = len(rows) % 2
+            promoted = rows[odd:][self._rng.integers(2)::2]
+            self._levels[level] = rows[:odd]
+            self._levels[level + 1] = np.concatenate([self._levels[level + 1], promoted])
+
+    def _prune_top(self):
+        # Pruned only once a quarter more than the target has piled up, so a row is re-scored
+        # a bounded number of times on average
+        keep = int(np.ceil(TOP_CANDIDATE_FRACTION * self.count))
+        if len(self._top) <= max(keep + keep // 4, self.k):
+            return
+        self._top = self._top[np.argpartition(self._scores(self._top), len(self._top) - keep)[-keep:]]
+
+    def update(self, rows):
+        """
+        Add a chunk of workouts.
+
+        Args:
+            rows (np.ndarray): Array of shape (n, n_features)
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        if len(rows) == 0:
+            return
+        self.count, self.mean, self.variance = merge_moments(
+            self.count, self.mean, self.variance, len(rows), rows.mean(axis=0), rows.var(axis=0))
+        self._levels[0] = np.concatenate([self._levels[0], rows])
+        self._top = np.concatenate([self._top, rows])
+        self._compress()
+        self._prune_top()
+
+    def merge(self, other):
+        """
+        Fold another sketch (e.g. of another shard of the data) into this one.
+
+        Args:
+            other (ReferenceSketch): Sketch over the same features
+        """
+        self.count, self.mean, self.variance = merge_moments(
+            self.count, self.mean, self.variance, other.count, other.mean, other.variance)
+        for level, rows in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(np.empty((0, rows.shape[1])))
+            self._levels[level] = np.concatenate([self._levels[level], rows])
+        self._top = np.concatenate([self._top, other._top])
+        self._compress()
+        self._prune_top()
+
+    def rows(self):
+        """Return (rows, weights) of the retained workouts"""
+        rows = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level_rows), 2.0 ** level)
+                                  for level, level_rows in enumerate(self._levels)])
+        return rows, weights
+
+    def statistics(self, features):
+        """
+        Percentile reference of the sketched workouts, see reference_statistics.
+
+        Args:
+            features (list): Feature names, in column order
+
+        Returns:
+            dict: composite_mean, composite_scale, sorted_scores and top_metrics
+        """
+        composite_mean, composite_scale = self.mean, self.composite_scale
+        rows, weights = self.rows()
+        if self.is_exact():
+            reference = reference_statistics(rows, features, composite_mean, composite_scale)
+            return {key: reference[key] for key in ('composite_mean', 'composite_scale',
+                                                     'sorted_scores', 'top_metrics')}
+
+        scores = ((rows - composite_mean) / composite_scale).mean(axis=1)
+        order = np.argsort(scores, kind='stable')
+        scores, rows, weights = scores[order], rows[order], weights[order]
+        cumulative = np.cumsum(weights)
+        total = cumulative[-1]
+
+        # Equally weighted score quantiles, so rank_percentiles works on them unchanged
+        grid = (np.arange(SORTED_SCORES_SIZE) + 0.5) * (total / SORTED_SCORES_SIZE)
+        sorted_scores = scores[np.minimum(np.searchsorted(cumulative, grid), len(scores) - 1)]
+
+        # The rows reference_statistics puts at or above the 90th percentile, from the exact candidates
+        top_count = min(self.count - int(np.ceil(0.9 * (self.count - 1))), len(self._top))
+        top_scores = ((self._top - composite_mean) / composite_scale).mean(axis=1)
+        top_rows = self._top[np.argpartition(top_scores, len(self._top) - top_count)[-top_count:]]
+        top_metrics = {feat: float(value) for feat, value in zip(features, np.nanmedian(top_rows, axis=0))}
+        return {
+            'composite_mean': composite_mean,
+            'composite_scale': composite_scale,
+            'sorted_scores': sorted_scores,
+            'top_metrics': top_metrics,
+        }
+
+    def to_arrays(self):
+        """Arrays to store the sketch in a model artifact, see from_arrays"""
+        rows, weights = self.rows()
+        return {
+            'sketch_k': np.array(self.k),
+            'sketch_count': np.array(self.count),
+            'sketch_mean': self.mean,
+            'sketch_variance': self.variance,
+            'sketch_rows': rows,
+            'sketch_levels': np.log2(weights).astype(np.int64),
+            'sketch_top_rows': self._top,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Rebuild a sketch stored with to_arrays.
+
+        Args:
+            arrays: Mapping (dict or NpzFile) with the sketch_* arrays
+        """
+        rows = np.asarray(arrays['sketch_rows'], dtype=np.float64)
+        levels = np.asarray(arrays['sketch_levels'])
+        sketch = cls(rows.shape[1], k=int(arrays['sketch_k']))
+        sketch.count = int(arrays['sketch_count'])
+        sketch.mean = np.asarray(arrays['sketch_mean'], dtype=np.float64)
+        sketch.variance = np.asarray(arrays['sketch_variance'], dtype=np.float64)
+        sketch._levels = [rows[levels == level] for level in range(int(levels.max(initial=0)) + 1)]
+        if 'sketch_top_rows' in arrays:
+            sketch._top = np.asarray(arrays['sketch_top_rows'], dtype=np.float64)
+        else:
+            # Stored before the candidates were kept: start from the retained rows, which is
+            # exact for sketches that were never compacted
+            sketch._top = np.repeat(rows, 2 ** levels, axis=0)
+            sketch._prune_top()
+        return sketch
@@ -1,21 +1,80 @@
+import os
+import sys
+import time
+import argparse
 import pandas as pd
 
-df = pd.read_csv('../workout_fitness_tracker_data.csv')
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.classify_user import calculate_formulas
+from predictor.scripts.feature_store import FEATURES, FeatureMatrixWriter, feature_matrix_path, file_sha256
 
 
-def calculate_formulas(df):
-    df['HRmax'] = 208 - 0.7 * df['Age']
-    df['HR%'] = (df['Heart Rate (bpm)'] / df['HRmax']) * 100
-    df['TLI'] = df['Heart Rate (bpm)'] * df['Workout Duration (mins)']
-    df['MET'] = (df['Heart Rate (bpm)'] / df['Resting Heart Rate (bpm)']) * 3.5
-    df['WEI'] = (df['HR%'] * df['Distance (km)']) / df['Workout Duration (mins)']
-    return df
+def partition_workouts(source_path="workout_fitness_tracker_data.csv",
+                       output_dir="sorted_and_calculated_data",
+                       chunksize=100000,
+                       type_column="Workout Type"):
+    """
+    Split the source CSV into one <type>_analysis.csv per workout type in a single pass.
 
+    The source is read in chunks; every chunk gets the derived columns of calculate_formulas
+    and its rows are appended to the partition of their workout type, so memory depends on
+    the chunk size only. Partitions are written under temporary names and moved into place
+    once the whole source has been read. Each partition also gets a <type>_features.npy
+    matrix of the model features (see feature_store), so training does not parse the CSV.
 
-workout_types = df['Workout Type'].unique()
-for workout in workout_types:
-    workout_df = df[df['Workout Type'] == workout].copy()
-    workout_df = calculate_formulas(workout_df)
-    workout_df.to_csv(f'sorted_and_calculated_data/{workout}_analysis.csv', index=False)
+    Args:
+        source_path (str): CSV with the workouts of all types
+        output_dir (str): Directory for the *_analysis.csv partitions
+        chunksize (int): Rows read at a time
+        type_column (str): Column holding the workout type
 
-print("Analysis complete. Files saved by workout type.")
+    Returns:
+        dict: Number of rows written per workout type
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    partitions = {}
+    matrices = {}
+    counts = {}
+
+    try:
+        for chunk in pd.read_csv(source_path, chunksize=chunksize):
+            chunk = calculate_formulas(chunk)
+            for workout, rows in chunk.groupby(type_column, sort=False):
+                file = partitions.get(workout)
+                header = file is None
+                if header:
+                    output_path = os.path.join(output_dir, f"{workout}_analysis.csv")
+                    file = partitions[workout] = open(f"{output_path}.tmp", "w", newline="")
+                    matrices[workout] = FeatureMatrixWriter(feature_matrix_path(output_path))
+                rows.to_csv(file, index=False, header=header)
+                matrices[workout].append(rows[FEATURES].to_numpy())
+                counts[workout] = counts.get(workout, 0) + len(rows)
+    except BaseException:
+        for workout, file in partitions.items():
+            file.close()
+            os.remove(file.name)
+            matrices[workout].discard()
+        raise
+
+    for workout, file in partitions.items():
+        file.close()
+        output_path = os.path.join(output_dir, f"{workout}_analysis.csv")
+        os.replace(file.name, output_path)
+        matrices[workout].close(source=os.path.basename(output_path), source_sha256=file_sha256(output_path))
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition the workout data by workout type")
+    parser.add_argument("--source", default="workout_fitness_tracker_data.csv")
+    parser.add_argument("--output-dir", default="sorted_and_calculated_data")
+    parser.add_argument("--chunksize", type=int, default=100000, help="Rows read at a time")
+    args = parser.parse_args()
+
+    started = time.time()
+    counts = partition_workouts(args.source, args.output_dir, args.chunksize)
+    for workout, count in sorted(counts.items()):
+        print(f"{workout}: {count} rows")
+    print(f"Analysis complete. Files saved by workout type ({time.time() - started:.1f}s).")
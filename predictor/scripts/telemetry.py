@@ -0,0 +1,215 @@
+import json
+import time
+import bisect
+import logging
+import threading
+
+# Upper bounds (s) of the latency histogram buckets, from sub-millisecond lookups to model loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        """
+        Monotonic counter with one series per combination of label values.
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            label_names (tuple): Names of the labels, their values are passed positionally
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_label_text(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        Cumulative histogram with one series per combination of label values.
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            label_names (tuple): Names of the labels, their values are passed positionally
+            buckets (tuple): Sorted bucket upper bounds, +Inf is implied
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, labels, [le])} {cumulative}")
+            label_text = _label_text(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+# Process-wide metrics; inference and parser worker processes keep their own
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram('workout_stage_duration_seconds',
+                                   'Time spent in each stage of the upload pipeline',
+                                   ('stage', 'workout_type'))
+STAGE_ERRORS = REGISTRY.counter('workout_stage_errors_total',
+                                'Stages of the upload pipeline that raised',
+                                ('stage', 'workout_type'))
+
+# workout_type label of types outside model_registry.WORKOUT_TYPES: the type comes from
+# request fields, and every distinct value would otherwise add series that are kept forever
+OTHER_WORKOUT_TYPE = 'other'
+_known_workout_types = None
+
+
+def workout_type_label(workout_type):
+    """The workout_type label value of a workout type"""
+    global _known_workout_types
+    if not workout_type:
+        return ''
+    if _known_workout_types is None:
+        # Imported on first use, model_registry itself uses timed
+        from predictor.scripts.model_registry import WORKOUT_TYPES
+        _known_workout_types = frozenset(WORKOUT_TYPES)
+    return workout_type if workout_type in _known_workout_types else OTHER_WORKOUT_TYPE
+
+
+class timed:
+    """
+    Observe the duration of a with block in STAGE_SECONDS, and count it in STAGE_ERRORS if it raises.
+
+    A plain class rather than a @contextmanager generator, which costs several times more
+    per block.
+
+    Args:
+        stage (str): Pipeline stage, e.g. "fit_parse"
+        workout_type (str): Workout type the stage ran for; when it is only known inside the
+            block, set it on the object returned by the with statement. Unknown types are
+            recorded as OTHER_WORKOUT_TYPE.
+    """
+    __slots__ = ('stage', 'workout_type', '_started')
+
+    def __init__(self, stage, workout_type=''):
+        self.stage = stage
+        self.workout_type = workout_type
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        labels = (self.stage, workout_type_label(self.workout_type))
+        STAGE_SECONDS.observe(time.perf_counter() - self._started, labels)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(labels)
+        return False
+
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the extra= fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level="WARNING", json_format=True, logger_names=("predictor", "app")):
+    """
+    Send the logs of the given loggers to stderr, as JSON lines or as plain text.
+
+    Records below the level are dropped by the logger's level check before any message
+    or extra fields are formatted.
+
+    Args:
+        level (str): Logging level name, e.g. "INFO"
+        json_format (bool): Write JSON lines instead of plain text
+        logger_names (tuple): Loggers to configure (the package loggers by default)
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_format else
+                         logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    for name in logger_names:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        for existing in [h for h in logger.handlers if getattr(h, '_telemetry', False)]:
+            logger.removeHandler(existing)
+        handler._telemetry = True
+        logger.addHandler(handler)
+        logger.propagate = False
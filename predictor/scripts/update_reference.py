@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.create_models import update_reference_statistics
+from predictor.scripts.quantile_sketch import ReferenceSketch
+
+FEATURES = ['HRmax', 'HR%', 'TLI', 'MET', 'WEI']
+
+
+def sketch_new_workouts(csv_paths, workout_type=None, chunksize=100000):
+    """
+    Stream CSVs in chunks into one ReferenceSketch per workout type, computing the
+    features when a CSV only has the raw columns written by parse_fit_file.
+
+    Args:
+        csv_paths (list): CSVs in the *_analysis.csv or parse_fit_file format (e.g. one per shard)
+        workout_type (str): Treat every row as this type instead of reading 'Workout Type'
+        chunksize (int): Rows read at a time
+
+    Returns:
+        tuple: (dict of ReferenceSketch by workout type, dict of skipped incomplete rows by type)
+    """
+    import pandas as pd
+    from predictor.scripts.classify_user import calculate_formulas
+
+    sketches, skipped = {}, {}
+    for csv_path in csv_paths:
+        for chunk in pd.read_csv(csv_path, na_values=['N/A'], chunksize=chunksize):
+            if not set(FEATURES).issubset(chunk.columns) or chunk[FEATURES].isna().all().any():
+                chunk = calculate_formulas(chunk)
+            groups = [(workout_type, chunk)] if workout_type is not None else chunk.groupby('Workout Type')
+
+            for group_type, workouts in groups:
+                rows = workouts[FEATURES].to_numpy(dtype=np.float64)
+                finite = np.isfinite(rows).all(axis=1)
+                sketches.setdefault(group_type, ReferenceSketch(len(FEATURES))).update(rows[finite])
+                skipped[group_type] = skipped.get(group_type, 0) + int((~finite).sum())
+    return sketches, skipped
+
+
+def update_models(csv_paths, model_dir="models", workout_type=None, chunksize=100000):
+    """
+    Update the reference statistics of every workout type found in the CSVs.
+
+    Args:
+        csv_paths (list): CSVs with the new workouts
+        model_dir (str): Directory containing the model artifacts
+        workout_type (str): Treat every row as this type instead of reading 'Workout Type'
+        chunksize (int): Rows read at a time
+    """
+    sketches, skipped = sketch_new_workouts(csv_paths, workout_type, chunksize)
+
+    for group_type, sketch in sorted(sketches.items()):
+        started = time.perf_counter()
+        try:
+            result = update_reference_statistics(os.path.join(model_dir, group_type), sketch)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Skipping {group_type}: {e}")
+            continue
+        print(f"Updated {group_type}: +{result['added']} workouts ({skipped[group_type]} incomplete skipped), "
+              f"{result['reference_size']} in reference, {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(f"  Top metrics: {result['top_metrics']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold new workouts into the models' reference statistics")
+    parser.add_argument("csv_paths", nargs="+", help="CSVs with new workouts (analysis or parse_fit_file format)")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--workout-type", default=None, help="Workout type of every row (default: per row)")
+    parser.add_argument("--chunksize", type=int, default=100000, help="Rows read at a time")
+    args = parser.parse_args()
+
+    update_models(args.csv_paths, args.model_dir, args.workout_type, args.chunksize)
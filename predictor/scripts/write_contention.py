@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.load_test import serve_app
+
+
+def _request(port, method, path, body=None, timeout=60):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request(method, path, body=None if body is None else json.dumps(body),
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def contend(threads=8, writes=40, group_commit=False):
+    """
+    Update one item from many threads at once against a file-backed SQLite database.
+
+    Every PUT /items/<id> reads the row and then writes it, the pattern that fails with
+    "database is locked" when write transactions do not take the lock when they begin.
+
+    Args:
+        threads (int): Concurrent writers
+        writes (int): PUTs per writer
+        group_commit (bool): Run the app with GROUP_COMMIT
+
+    Returns:
+        dict: Number of requests and of failed requests
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        url, server = serve_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'contention.db')}",
+                                 'RESULT_CACHE_SIZE': 0, 'BULK_PARSE_PROCESSES': 0, 'GROUP_COMMIT': group_commit,
+                                 'LOG_LEVEL': 'CRITICAL'})
+        from app import db
+        try:
+            with server.app.app_context():
+                db.create_all()
+            port = server.server_port
+            status, body = _request(port, 'POST', '/items', {'name': 'contended', 'description': ''})
+            item_id = json.loads(body)['id']
+
+            def writer(index):
+                return [_request(port, 'PUT', f'/items/{item_id}', {'name': f'{index}-{n}', 'description': ''})
+                        for n in range(writes)]
+
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                outcomes = [outcome for outcomes in executor.map(writer, range(threads)) for outcome in outcomes]
+        finally:
+            server.shutdown()
+            extension = server.app.extensions.get('group_commit')
+            if extension is not None:
+                extension.close()
+            with server.app.app_context():
+                db.engine.dispose()
+
+    return {'requests': len(outcomes), 'failed': sum(status != 200 for status, _ in outcomes)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that concurrent writers never fail with 'database is locked'")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=40, help="Writes per thread")
+    args = parser.parse_args()
+
+    failures = 0
+    for group_commit in (False, True):
+        result = contend(args.threads, args.writes, group_commit)
+        failures += result['failed']
+        print(f"GROUP_COMMIT={group_commit}: {result['requests']} writes, {result['failed']} failed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (base_dir, os.path.join(base_dir, "flask")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+from app import create_app, db
+
+
+@pytest.fixture
+def client():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'RESULT_CACHE_SIZE': 0, 'BULK_PARSE_PROCESSES': 0})
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    response = client.post('/items', json=[{'name': f'item {i}', 'description': ''} for i in range(5)])
+    assert response.status_code == 201
+    return client
+
+
+def test_list_without_paging_params(client):
+    response = client.get('/items')
+    assert response.status_code == 200
+    items = response.get_json()
+    assert [item['name'] for item in items] == [f'item {i}' for i in range(5)]
+    assert set(items[0]) == {'id', 'name', 'description'}
+
+    response = client.get('/items?fields=name')
+    assert response.get_json()[0] == {'name': 'item 0'}
+
+
+def test_pages(client):
+    names = []
+    response = client.get('/items?limit=2').get_json()
+    while True:
+        names += [item['name'] for item in response['items']]
+        if response['next_cursor'] is None:
+            break
+        response = client.get(f"/items?limit=2&after={response['next_cursor']}").get_json()
+    assert names == [f'item {i}' for i in range(5)]
+
+
+def test_conditional_get(client):
+    etag = client.get('/items').headers['ETag']
+    assert client.get('/items', headers={'If-None-Match': etag}).status_code == 304
+    # The paged and the list shape of the same rows are different representations
+    assert client.get('/items?limit=10', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,87 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+from predictor.scripts.feature_store import FEATURES
+from predictor.scripts.numpy_inference import rank_percentiles
+from predictor.scripts.quantile_sketch import ReferenceSketch, reference_statistics
+
+ROWS = 400_000
+CHUNK = 10_000
+
+
+@pytest.fixture(scope="module")
+def reference():
+    """Workouts shaped like the training data: correlated, skewed features"""
+    rng = np.random.default_rng(0)
+    effort = rng.gamma(4.0, 0.25, ROWS)
+    data = np.column_stack([
+        rng.normal(175, 12, ROWS),
+        np.clip(rng.normal(60 + 10 * effort, 8), 30, 100),
+        rng.lognormal(8.3, 0.5, ROWS) * effort,
+        rng.gamma(6.0, 1.2, ROWS),
+        rng.lognormal(0.0, 0.6, ROWS) * effort,
+    ])
+    return data, reference_statistics(data, FEATURES)
+
+
+def _assert_close(sketch, exact, data):
+    statistics = sketch.statistics(FEATURES)
+    np.testing.assert_allclose(statistics['composite_mean'], exact['composite_mean'])
+    np.testing.assert_allclose(statistics['composite_scale'], exact['composite_scale'])
+
+    # top_metrics feed the recommendation thresholds (e.g. 0.2 WEI), so they must stay accurate
+    for feat in FEATURES:
+        assert statistics['top_metrics'][feat] == pytest.approx(exact['top_metrics'][feat], rel=0.005), feat
+
+    scores = ((data[::97] - exact['composite_mean']) / exact['composite_scale']).mean(axis=1)
+    error = rank_percentiles(scores, statistics['sorted_scores']) - rank_percentiles(scores, exact['sorted_scores'])
+    assert np.abs(error).max() < 1.5
+
+
+def test_small_reference_is_exact(reference):
+    data = reference[0][:1000]
+    exact = reference_statistics(data, FEATURES)
+    sketch = ReferenceSketch(len(FEATURES))
+    sketch.update(data)
+    assert sketch.is_exact()
+    statistics = sketch.statistics(FEATURES)
+    assert statistics['top_metrics'] == exact['top_metrics']
+    np.testing.assert_array_equal(statistics['sorted_scores'], exact['sorted_scores'])
+
+
+def test_streamed_reference(reference):
+    data, exact = reference
+    sketch = ReferenceSketch(len(FEATURES))
+    for start in range(0, ROWS, CHUNK):
+        sketch.update(data[start:start + CHUNK])
+    assert not sketch.is_exact()
+    _assert_close(sketch, exact, data)
+
+
+def test_merged_shards(reference):
+    data, exact = reference
+    shards = []
+    for shard in np.array_split(data, 4):
+        sketch = ReferenceSketch(len(FEATURES))
+        for start in range(0, len(shard), CHUNK):
+            sketch.update(shard[start:start + CHUNK])
+        shards.append(sketch)
+    merged = shards[0]
+    for sketch in shards[1:]:
+        merged.merge(sketch)
+    _assert_close(merged, exact, data)
+
+
+def test_stored_sketch(reference):
+    data, exact = reference
+    sketch = ReferenceSketch(len(FEATURES))
+    for start in range(0, ROWS, CHUNK):
+        sketch.update(data[start:start + CHUNK])
+    restored = ReferenceSketch.from_arrays(sketch.to_arrays())
+    assert restored.statistics(FEATURES)['top_metrics'] == sketch.statistics(FEATURES)['top_metrics']
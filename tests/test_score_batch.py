@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (base_dir, os.path.join(base_dir, "flask")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+from app import create_app
+
+WORKOUT = {'HRmax': 160, 'HR%': 75, 'TLI': 7000, 'MET': 6.5, 'WEI': 1.1}
+
+
+@pytest.fixture
+def client():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'RESULT_CACHE_SIZE': 0, 'BULK_PARSE_PROCESSES': 0})
+    return app.test_client()
+
+
+def test_scores_workouts(client):
+    response = client.post('/score/batch', json={'workout_type': 'Running', 'workouts': [WORKOUT, WORKOUT]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == 2
+    assert all(0 <= percentile <= 100 for percentile in body['percentiles'])
+
+
+def test_empty_batch(client):
+    response = client.post('/score/batch', json={'workout_type': 'Running', 'workouts': []})
+    assert response.status_code == 200
+    assert response.get_json() == {'workout_type': 'Running', 'count': 0, 'percentiles': []}
+
+
+@pytest.mark.parametrize('value', ['null', 'NaN', 'Infinity'])
+def test_rejects_missing_values(client, value):
+    # Python's JSON parser accepts NaN and Infinity, so they reach the model unless rejected
+    body = ('{"workout_type": "Running", "workouts": [{"HRmax": 160, "HR%%": 75, "TLI": 7000, "MET": 6.5, "WEI": 1.1}, '
+            '{"HRmax": 160, "HR%%": 75, "TLI": 7000, "MET": 6.5, "WEI": %s}]}' % value)
+    response = client.post('/score/batch', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert '[1]' in response.get_json()['details']